@@ -0,0 +1,114 @@
+# background.py
+# Runs slow work on worker threads for a Tk (or any single-threaded) loop.
+# Workers never touch widgets: progress and results go through a
+# queue.Queue, and poll(), called from the loop with root.after, runs the
+# callbacks on the loop's thread. Requests have a kind ("search", "io");
+# submitting one cancels the previous request of that kind, and anything it
+# still sends back is ignored. An exception from a callback drops its
+# request and goes to on_error like one from the work itself.
+import itertools
+import queue
+import threading
+import time
+
+class Cancelled(Exception):
+    pass
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled
+
+class BackgroundExecutor:
+    def __init__(self, max_queued=64):
+        # Bounded, so a fast producer waits for the loop instead of
+        # buffering a whole file of batches
+        self.results = queue.Queue(max_queued)
+        self.current = {}  # kind -> (request id, token, callbacks)
+        self.ids = itertools.count(1)
+
+    def submit(self, kind, work, on_done, on_progress=None, on_error=None, on_cancel=None):
+        # work(token, emit) runs on a new daemon thread; emit(item) hands an
+        # item to on_progress and raises Cancelled once the request is
+        # cancelled. The return value goes to on_done, exceptions to on_error.
+        self.cancel(kind)
+        request = next(self.ids)
+        token = CancelToken()
+        self.current[kind] = (request, token, on_done, on_progress, on_error, on_cancel)
+
+        def emit(item):
+            while True:
+                token.check()
+                try:
+                    self.results.put((kind, request, "progress", item), timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def run():
+            try:
+                message = ("done", work(token, emit))
+            except Cancelled:
+                return
+            except Exception as e:
+                message = ("error", e)
+            if not token.cancelled:
+                self.results.put((kind, request, *message))
+
+        threading.Thread(target=run, daemon=True).start()
+        return token
+
+    def cancel(self, kind):
+        entry = self.current.pop(kind, None)
+        if entry is None:
+            return False
+        entry[1].cancel()
+        if entry[5] is not None:
+            entry[5]()
+        return True
+
+    def busy(self, kind):
+        return kind in self.current
+
+    def poll(self, budget=0.008):
+        # Dispatch queued messages until the queue is empty or budget seconds
+        # have passed, so one call stays well inside a 16ms frame
+        deadline = time.perf_counter() + budget
+        while time.perf_counter() < deadline:
+            try:
+                kind, request, what, payload = self.results.get_nowait()
+            except queue.Empty:
+                return
+            entry = self.current.get(kind)
+            if entry is None or entry[0] != request:
+                continue  # superseded or cancelled
+            _, _, on_done, on_progress, on_error, _ = entry
+            try:
+                if what == "progress":
+                    if on_progress is not None:
+                        on_progress(payload)
+                    continue
+                del self.current[kind]
+                if what == "done":
+                    on_done(payload)
+                    continue
+            except Exception as e:
+                # A failing callback drops its request, so the worker stops
+                # and the kind is free again
+                if self.current.get(kind) is entry:
+                    self.cancel(kind)
+                payload = e
+            if on_error is not None:
+                on_error(payload)
+            else:
+                raise payload
@@ -0,0 +1,281 @@
+# bench_contacts.py
+# Run: python bench_contacts.py suite [--sizes N ...] [--output FILE] [--baseline FILE]
+#      python bench_contacts.py records [rows]
+#      python bench_contacts.py backends [rows ...]   (default 10k 1M 10M)
+#      python bench_contacts.py columns [rows]
+#      python bench_contacts.py snapshot [rows]
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from contacts_logic import (ColumnarContacts, Contact, format_contact, iter_csv_batches,
+                            iter_snapshot_batches, parse_contact, search_contacts,
+                            write_csv_batches, write_snapshot_batches)
+from contacts_storage import MemoryBackend, SQLiteBackend
+
+FIRST_NAMES = ["Clara", "Marcus", "Elena", "Jacob", "Nina", "Trevor", "Kelsey", "Omar", "Ava",
+               "Henry", "Zoe", "Caleb", "Bianca", "Arjun", "Lily", "Sofia", "Liam", "Maya",
+               "Noah", "Priya", "Ethan", "Grace", "Mateo", "Hana", "Lucas", "Amara", "Owen"]
+LAST_NAMES = ["Whitmore", "Delaney", "Rodriguez", "Lin", "Caldwell", "Banks", "Huang", "Bennett",
+              "Patel", "Callahan", "McIntyre", "Simmons", "Russo", "Kapoor", "Tran", "Nguyen",
+              "Garcia", "Okafor", "Schmidt", "Rossi", "Kim", "Novak", "Silva", "Haddad", "Moreau"]
+STREETS = ["Brookstone", "Pine Hollow", "Sycamore", "W Foster", "Red Oak", "Pine Hill",
+           "Jade Garden", "Aspen", "Summerfield", "Ridgeview", "Lakeview", "Indigo", "Fern Hollow",
+           "Prairie", "Willowbend", "Maple", "Cedar Crest", "Harbor", "Juniper", "Granite"]
+SUFFIXES = ["Dr", "Ln", "Ct", "Ave", "Way", "Rd", "Blvd", "Loop", "Cir", "Run", "St"]
+AREA_CODES = ["512", "303", "602", "773", "919", "518", "206", "208", "949", "972", "608",
+              "904", "412", "402", "408", "617", "305", "415", "312", "503"]
+
+def sample_row(i):
+    return f"Person {i}", f"{i} Main St", f"555-{i % 10000:04d}"
+
+def generate_contacts(n, seed=0):
+    # Reproducible contacts shaped like contacts.csv
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield Contact(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                      f"{rng.randint(1, 9999)} {rng.choice(STREETS)} {rng.choice(SUFFIXES)}",
+                      f"{rng.choice(AREA_CODES)}-555-{rng.randint(0, 9999):04d}")
+
+def write_dataset(path, n, seed=0):
+    for _ in write_csv_batches(path, generate_contacts(n, seed), 10_000):
+        pass
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, size
+
+def compare_representations(n):
+    # Field strings are created inside each build so both sides pay for them
+    strings, str_build, str_bytes = measure(
+        lambda: [format_contact(*sample_row(i)) for i in range(n)])
+    records, rec_build, rec_bytes = measure(
+        lambda: [Contact(*sample_row(i)) for i in range(n)])
+
+    # Field access as done by on_select/save_contacts/update_contact
+    start = time.perf_counter()
+    for s in strings:
+        parse_contact(s)[2]
+    str_access = time.perf_counter() - start
+    start = time.perf_counter()
+    for c in records:
+        c.phone
+    rec_access = time.perf_counter() - start
+
+    return {
+        "rows": n,
+        "string": {"bytes_per_row": str_bytes / n, "build_s": str_build, "access_s": str_access},
+        "contact": {"bytes_per_row": rec_bytes / n, "build_s": rec_build, "access_s": rec_access},
+    }
+
+def compare_columnar(n, query="rodriguez"):
+    # Bytes per contact held by a list of Contact records and by the
+    # columnar store, with and without interned address words
+    results = {}
+    for name, build in (("list", lambda: list(generate_contacts(n))),
+                        ("columnar", lambda: ColumnarContacts(generate_contacts(n))),
+                        ("interned", lambda: ColumnarContacts(generate_contacts(n), True))):
+        contacts, _, size = measure(build)
+        if name == "list":
+            _, search_s = timed(search_contacts, contacts, query)
+        else:
+            _, search_s = timed(contacts.search, query)
+        results[name] = {"bytes_per_contact": size / n, "search_s": search_s}
+    return results
+
+def compare_snapshot(n):
+    # Load times of the same contacts from CSV and from binary snapshots,
+    # into Contact records and, for snapshots, into the columnar store
+    def load(read, path):
+        return [c for batch, _ in read(path, 10_000) for c in batch]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "contacts.csv")
+        write_dataset(csv_path, n)
+        contacts, csv_load = timed(load, iter_csv_batches, csv_path)
+        results = {"csv": {"bytes": os.path.getsize(csv_path), "load_s": csv_load}}
+        for name, compress in (("snapshot", False), ("snapshot_zlib", True)):
+            path = os.path.join(tmp, name + ".cbk")
+            _, save_s = timed(lambda: sum(1 for _ in write_snapshot_batches(path, contacts,
+                                                                           compress=compress)))
+            _, load_s = timed(load, iter_snapshot_batches, path)
+            _, columnar_s = timed(ColumnarContacts.from_snapshot, path)
+            results[name] = {"bytes": os.path.getsize(path), "save_s": save_s,
+                             "load_s": load_s, "columnar_load_s": columnar_s}
+        return results
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def compare_backends(n, queries=("rodriguez", "pine hollow", "-555-004", "zzz")):
+    # The two books the GUI can run on: in memory (persisted by saving a
+    # file) and SQLite (--db, each edit committed). Times CSV import, the
+    # name-ordered searches the list shows, one edit, CSV export and, for
+    # SQLite, reopening the database.
+    edited = Contact("Edited", "1 Main St", "555-0000")
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "contacts.csv")
+        db_path = os.path.join(tmp, "contacts.db")
+        write_dataset(csv_path, n)
+        results = {}
+        for name, backend in (("memory", MemoryBackend()), ("sqlite", SQLiteBackend(db_path))):
+            _, import_s = timed(backend.import_csv, csv_path)
+            search_s = sum(timed(backend.find, q)[1] for q in queries) / len(queries)
+            _, edit_s = timed(backend.update, backend.order[0], edited)
+            _, export_s = timed(backend.export_csv, os.path.join(tmp, f"{name}.csv"))
+            backend.close()
+            results[name] = {"import_s": import_s, "search_s": search_s,
+                             "edit_s": edit_s, "export_s": export_s}
+        reopened, results["sqlite"]["open_s"] = timed(SQLiteBackend, db_path)
+        reopened.close()
+        return results
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def suite_operations(contacts, csv_path, seed):
+    # Each operation works on the whole data set. Timing and tracemalloc
+    # runs are separate because tracing slows Python code down several times.
+    strings = [str(c) for c in contacts]
+    rng = random.Random(seed)
+    queries = [rng.choice(LAST_NAMES), rng.choice(STREETS), f"-555-{rng.randint(0, 99):02d}", "zzzz"]
+
+    def save():
+        for _ in write_csv_batches(csv_path, contacts, 10_000):
+            pass
+
+    def load():
+        return [c for batch, _ in iter_csv_batches(csv_path, 10_000) for c in batch]
+
+    # Ordered: csv_load reads what csv_save wrote
+    return {
+        "format_contact": lambda: [format_contact(*c) for c in contacts],
+        "parse_contact": lambda: [parse_contact(s) for s in strings],
+        "search_contacts": lambda: [search_contacts(contacts, q) for q in queries],
+        "csv_save": save,
+        "csv_load": load,
+    }
+
+def run_suite(sizes, seed=0, memory=True):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            contacts = list(generate_contacts(n, seed))
+            ops = suite_operations(contacts, os.path.join(tmp, "contacts.csv"), seed)
+            for name, op in ops.items():
+                _, seconds = timed(op)
+                results.setdefault(name, {})[str(n)] = {
+                    "seconds": seconds,
+                    "rows_per_s": n / seconds if seconds else None,
+                    "peak_bytes": peak_memory(op) if memory else None,
+                }
+    return {
+        "meta": {"seed": seed, "sizes": list(sizes), "python": platform.python_version(),
+                 "platform": platform.platform()},
+        "results": results,
+    }
+
+def compare(current, baseline, tolerance=0.25):
+    # Regressions where time or peak memory grew by more than tolerance
+    # over the baseline; operations or sizes missing from either are skipped
+    regressions = []
+    for name, by_size in current["results"].items():
+        for size, now in by_size.items():
+            before = baseline["results"].get(name, {}).get(size)
+            if before is None:
+                continue
+            for metric in ("seconds", "peak_bytes"):
+                if now[metric] is None or not before.get(metric):
+                    continue
+                ratio = now[metric] / before[metric]
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{name} @ {size}: {metric} {before[metric]:.4g} -> "
+                                       f"{now[metric]:.4g} ({ratio:.2f}x)")
+    return regressions
+
+def run_suite_command(args):
+    report = run_suite(args.sizes, args.seed, memory=not args.no_memory)
+    for name, by_size in report["results"].items():
+        for size, r in by_size.items():
+            peak = f"  peak {r['peak_bytes'] / 1e6:8.1f} MB" if r["peak_bytes"] is not None else ""
+            print(f"{name:16} {int(size):>10,} rows  {r['seconds']:8.3f}s{peak}")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+
+def main(argv):
+    if len(argv) > 1 and argv[1] == "suite":
+        parser = argparse.ArgumentParser(prog="bench_contacts.py suite")
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                            help="rows per run, e.g. 1000 10000 100000 1000000 10000000")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+        parser.add_argument("--output", help="write results as JSON")
+        parser.add_argument("--baseline", help="JSON results to compare against")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="allowed slowdown before a result counts as a regression")
+        run_suite_command(parser.parse_args(argv[2:]))
+        return
+    mode = argv[1] if len(argv) > 1 else "records"
+    if mode == "records":
+        n = int(argv[2]) if len(argv) > 2 else 200_000
+        result = compare_representations(n)
+        print(f"{n} rows")
+        for kind in ("string", "contact"):
+            r = result[kind]
+            print(f"  {kind:8} {r['bytes_per_row']:7.1f} B/row  "
+                  f"build {r['build_s']:.3f}s  field access {r['access_s']:.3f}s")
+    elif mode == "backends":
+        for n in [int(a) for a in argv[2:]] or [10_000, 1_000_000, 10_000_000]:
+            print(f"{n} rows")
+            for name, r in compare_backends(n).items():
+                print(f"  {name:7} import {r['import_s']:.2f}s  search {r['search_s'] * 1000:.1f}ms  "
+                      f"edit {r['edit_s'] * 1000:.2f}ms  export {r['export_s']:.2f}s"
+                      + (f"  reopen {r['open_s']:.2f}s" if "open_s" in r else ""))
+    elif mode == "columns":
+        n = int(argv[2]) if len(argv) > 2 else 200_000
+        print(f"{n} rows")
+        for name, r in compare_columnar(n).items():
+            print(f"  {name:8} {r['bytes_per_contact']:7.1f} B/contact  "
+                  f"search {r['search_s'] * 1000:.1f}ms")
+    elif mode == "snapshot":
+        n = int(argv[2]) if len(argv) > 2 else 1_000_000
+        results = compare_snapshot(n)
+        csv_load = results["csv"]["load_s"]
+        print(f"{n} rows")
+        print(f"  csv           {results['csv']['bytes'] / 1e6:7.1f} MB  load {csv_load:.2f}s")
+        for name in ("snapshot", "snapshot_zlib"):
+            r = results[name]
+            print(f"  {name:13} {r['bytes'] / 1e6:7.1f} MB  save {r['save_s']:.2f}s  "
+                  f"load {r['load_s']:.2f}s ({csv_load / r['load_s']:.1f}x)  "
+                  f"columnar load {r['columnar_load_s']:.2f}s "
+                  f"({csv_load / r['columnar_load_s']:.1f}x)")
+    else:
+        sys.exit(f"unknown mode: {mode}")
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,11 @@
+# conftest.py
+import pytest
+from contacts_logic import Contact
+
+@pytest.fixture
+def sample_contacts():
+    return [
+        Contact("Alice", "Wonderland", "111"),
+        Contact("Bob", "Builder Blvd", "222"),
+        Contact("Carol", "Crestview", "333"),
+    ]
@@ -1,21 +1,195 @@
 import tkinter as tk
 from tkinter import messagebox, filedialog
-import csv
+import argparse
+import gc
+import time
+from array import array
+from background import BackgroundExecutor
+from contacts_metrics import metrics
+from contacts_logic import (QueryCache, diff_contacts, file_signature, iter_contacts, make_contact,
+                            SNAPSHOT_EXT, batch_reader, batch_writer)
+from contacts_journal import Journal
+from contacts_mmap import MappedContacts
+from contacts_storage import MemoryBackend, SQLiteBackend
+from virtual_list import VirtualList
 
-contacts = []
+SEARCH_DELAY_MS = 150   # debounce for search-as-you-type
+IO_BATCH = 1000         # rows per after() slice, or per batch written by a save
+LOAD_BATCH = 50         # rows indexed per Tk callback while loading, a few ms each
+POLL_MS = 10            # how often worker results are picked up
+WATCH_MS = 1000         # how often a watched file is checked for changes
+FILE_TYPES = [("CSV files", "*.csv"), ("Contact snapshots", "*" + SNAPSHOT_EXT),
+              ("JSON Lines", "*.jsonl"), ("vCard", "*.vcf")]
+
+# The address book: a MemoryBackend, an SQLiteBackend with --db, or a
+# MappedContacts with --view. Contacts are known by a key that names the
+# same record for as long as it exists, whatever the list shows.
+book = MemoryBackend()
+# Keys shown in contact_list, one per row, so a row maps to its record in
+# O(1). Without a filter this is book.order itself, which stays sorted as
+# contacts are added or edited; filtered views are arrays of keys.
+view_keys = book.order
+view_cache = None       # QueryCache over the mapped file, with --view
+search_job = None       # pending debounced search
+io_job = None           # running chunked load/save, if any
+opening = False         # the journal is still being read in
+partial = False         # opening the journal was cancelled part way
+read_only = False       # book is a MappedContacts opened with --view
+journal = None          # Journal when started with --journal
+watch_path = None       # file kept in sync when started with --watch
+watch_signature = None  # its (mtime, size) when last read
+executor = BackgroundExecutor()  # worker threads for searches, loads and saves
+status_text = ""        # last message, shown with the latest timing
+shown_timing = None     # metrics.last as currently shown
+
+class SlicedJob:
+    # Drives a generator one step per after() tick so Tk keeps handling
+    # events between chunks of a long load or save.
+    def __init__(self, steps, on_step, on_done, on_cancel):
+        self.steps = steps
+        self.on_step = on_step
+        self.on_done = on_done
+        self.on_cancel = on_cancel
+        self.started = time.perf_counter()
+        self.after_id = root.after(0, self.tick)
+
+    def tick(self):
+        global io_job
+        try:
+            item = next(self.steps)
+        except StopIteration:
+            io_job = None
+            self.on_done(time.perf_counter() - self.started)
+            return
+        self.on_step(item)
+        self.after_id = root.after(1, self.tick)
+
+    def cancel(self):
+        root.after_cancel(self.after_id)
+        self.steps.close()
+        self.on_cancel()
+
+def start_io(steps, on_step, on_done, on_cancel):
+    global io_job
+    cancel_io()
+    io_job = SlicedJob(steps, on_step, on_done, on_cancel)
+
+def cancel_io():
+    global io_job
+    if io_job is not None:
+        job, io_job = io_job, None
+        job.cancel()
+    executor.cancel("io")
+
+def start_background_io(work, on_step, on_done, on_cancel):
+    # Like start_io, but work(token, emit) runs on a worker thread and
+    # on_step gets what it emits; on_done still receives the elapsed time
+    cancel_io()
+    started = time.perf_counter()
+    executor.submit("io", work, lambda _: on_done(time.perf_counter() - started),
+                    on_step, report_error, on_cancel)
+
+def io_busy():
+    return io_job is not None or executor.busy("io")
+
+def report_error(error):
+    set_status(f"Error: {error}")
+
+def set_status(text):
+    global status_text, shown_timing
+    status_text = text
+    shown_timing = metrics.last
+    if metrics.enabled and shown_timing is not None:
+        text = f"{text}    [{metrics.describe_last()}]"
+    status_label.config(text=text)
+
+def poll_background():
+    try:
+        executor.poll()
+        if metrics.enabled and metrics.last is not shown_timing:
+            # Something was timed since the status was set, maybe on a worker
+            set_status(status_text)
+    finally:
+        # Re-armed even if a callback raised, or nothing would be polled again
+        root.after(POLL_MS, poll_background)
+
+def rate(rows, elapsed):
+    return f"{rows / elapsed:,.0f} rows/s" if elapsed else "instant"
+
+def journal_row(key):
+    # Nothing is deleted from a journaled book, so contacts added since the
+    # last clear sit in ID order: that is their row in the journal's snapshot
+    return key - book.first_id
+
+def forget_contacts():
+    global partial
+    partial = False
+    book.clear()
+    book_changed()
+
+def book_changed():
+    # A search still running on a worker saw the old contacts; start it over
+    if executor.busy("search"):
+        search_contacts()
+
+def writable():
+    if read_only:
+        messagebox.showinfo("Read-only", "This book was opened with --view and cannot be changed.")
+    elif watch_path is not None:
+        # The watched file is the source of truth; the next change to it
+        # would silently undo anything edited here
+        messagebox.showinfo("Read-only", f"This book follows {watch_path} (--watch); "
+                            "edit that file instead.")
+    return not read_only and watch_path is None
+
+def editable():
+    # Adds and updates go to the journal by row, so they wait until it has
+    # been read in full; clear and load cancel the read and replace the
+    # book. Saves and compactions work on a snapshot and allow edits.
+    if not writable():
+        return False
+    if opening:
+        messagebox.showinfo("Busy", "Wait for the book to finish opening, or press Cancel.")
+        return False
+    if partial:
+        messagebox.showinfo("Partly loaded", "Only part of the book was read. "
+                            "Load or clear it before making changes.")
+        return False
+    return True
 
 def add_contact():
-    name = name_entry.get().strip()
-    address = address_entry.get().strip()
-    phone = phone_entry.get().strip()
-    if not name or not phone:
-        messagebox.showwarning("Input Error", "Name and phone are required.")
+    if not editable():
         return
-    contact = f"{name} | {address} | {phone}"
-    contacts.append(contact)
-    contact_listbox.insert(tk.END, contact)
+    contact = read_fields()
+    if contact is None or not confirm_duplicate(contact):
+        return
+    with metrics.measure("add_contact", 1):
+        if journal is not None:
+            journal.record_add(len(book), contact)
+        # Shown at the end of a filtered view until the next search
+        key = append_contacts([contact])[0]
+        if view_keys is book.order:
+            contact_list.see(book.order.rank(key))
     clear_fields()
-    status_label.config(text=f"Added: {name}")
+    set_status(f"Added: {contact.name}")
+    maybe_compact()
+
+def read_fields():
+    try:
+        return make_contact(name_entry.get().strip(),
+                            address_entry.get().strip(),
+                            phone_entry.get().strip())
+    except ValueError as e:
+        messagebox.showwarning("Input Error", str(e))
+        return None
+
+def confirm_duplicate(contact, key=None):
+    found = book.duplicates(contact, key)
+    if not found:
+        return True
+    other = book[found[0]]
+    return messagebox.askyesno(
+        "Duplicate Phone", f"{other.name} already has phone {other.phone}. Save anyway?")
 
 def clear_fields():
     name_entry.delete(0, tk.END)
@@ -23,117 +197,421 @@ def clear_fields():
     phone_entry.delete(0, tk.END)
 
 def clear_contacts():
-    if messagebox.askyesno("Clear All", "Are you sure you want to delete all contacts?"):
-        contacts.clear()
-        contact_listbox.delete(0, tk.END)
-        status_label.config(text="Contact list cleared.")
+    if writable() and messagebox.askyesno("Clear All", "Are you sure you want to delete all contacts?"):
+        cancel_io()
+        with metrics.measure("clear_contacts", len(book)):
+            if journal is not None:
+                journal.record_clear()
+            forget_contacts()
+            show_keys(book.order)
+        set_status("Contact list cleared.")
+        maybe_compact()
 
 def save_contacts():
-    filepath = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
+    filepath = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=FILE_TYPES)
     if filepath:
-        with open(filepath, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(["Name", "Address", "Phone"])
-            for contact in contacts:
-                writer.writerow(contact.split(" | "))
-        status_label.config(text=f"Saved to {filepath}")
+        # A snapshot, so edits made while saving do not shift the rows; a
+        # mapped file cannot change, and copying it would decode every row
+        total = len(book)
+        snapshot = book if read_only else book.snapshot()
+
+        def on_step(written):
+            set_status(f"Saving {filepath}: {written / max(total, 1):.0%}")
+
+        def on_done(elapsed):
+            metrics.record("save_contacts", elapsed, total)
+            set_status(f"Saved {total} contacts to {filepath} ({rate(total, elapsed)})")
+
+        def on_cancel():
+            set_status(f"Save cancelled; {filepath} left unchanged.")
+
+        def work(token, emit):
+            # The format follows the file extension
+            steps = batch_writer(filepath)(filepath, snapshot, IO_BATCH)
+            try:
+                for written in steps:
+                    emit(written)
+            finally:
+                # Removes the temporary file if the save was cancelled
+                steps.close()
+
+        start_background_io(work, on_step, on_done, on_cancel)
 
 def load_contacts():
-    filepath = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
+    if not writable():
+        return
+    filepath = filedialog.askopenfilename(filetypes=FILE_TYPES)
     if filepath:
-        contacts.clear()
-        contact_listbox.delete(0, tk.END)
-        with open(filepath, mode='r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                contact = f"{row['Name']} | {row['Address']} | {row['Phone']}"
-                contacts.append(contact)
-                contact_listbox.insert(tk.END, contact)
-        status_label.config(text=f"Loaded from {filepath}")
-
-def search_contacts(event=None):
-    query = search_entry.get().strip().lower()
-    contact_listbox.delete(0, tk.END)
-    for contact in contacts:
-        if query in contact.lower():
-            contact_listbox.insert(tk.END, contact)
-    status_label.config(text=f"Search results for: {query}")
+        load_file(filepath)
+
+def load_file(filepath):
+    cancel_io()
+    # Loading replaces the book, in the database or journal too
+    if journal is not None:
+        journal.record_clear()
+    forget_contacts()
+    show_keys(book.order)
+
+    def on_step(item):
+        batch, progress = item
+        if journal is not None:
+            journal.record_adds(len(book), batch)
+        append_contacts(batch)
+        set_status(f"Loading {filepath}: {progress:.0%} ({len(book)} rows)")
+
+    def on_done(elapsed):
+        metrics.record("load_contacts", elapsed, len(book))
+        set_status(f"Loaded {len(book)} contacts from {filepath} ({rate(len(book), elapsed)})")
+        maybe_compact()
+
+    def on_cancel():
+        set_status(f"Load cancelled after {len(book)} rows.")
+
+    def work(token, emit):
+        # Parsing happens on the worker; the Tk thread only indexes
+        for item in batch_reader(filepath)(filepath, LOAD_BATCH):
+            emit(item)
+
+    start_background_io(work, on_step, on_done, on_cancel)
+
+def append_contacts(batch):
+    # Adds the contacts to the book; returns their keys
+    keys = book.add_many(batch)
+    # The book only grows by these objects; moving them out of the collector's
+    # generations stops full collections rescanning it, which took up to a
+    # second per batch on large loads
+    gc.freeze()
+    book_changed()
+    if view_keys is not book.order:
+        view_keys.extend(keys)
+    contact_list.refresh()
+    return keys
+
+def remove_contacts(keys):
+    for key in keys:
+        book.delete(key)
+    if keys and view_keys is not book.order:
+        view_keys[:] = array("q", (key for key in view_keys if key in book))
+    book_changed()
+    contact_list.refresh()
+
+def open_store(path):
+    # The book is the database: only the names are read in to order the
+    # list, records are read as they are shown, searches go to its full-text
+    # index and every edit is committed as it is made
+    global book
+    start = time.perf_counter()
+    book = SQLiteBackend(path)
+    show_keys(book.order)
+    set_status(f"Opened {path}: {len(book)} contacts "
+               f"({rate(len(book), time.perf_counter() - start)})")
+
+def open_journal(path):
+    # Snapshot plus replayed journal; from then on each edit is appended
+    # to the journal instead of rewriting the CSV
+    global journal, opening
+    journal = Journal(path)
+    records = journal.load()
+    opening = True
+
+    def batches():
+        for start in range(0, len(records), LOAD_BATCH):
+            yield records[start:start + LOAD_BATCH]
+
+    def on_step(batch):
+        append_contacts(batch)
+        set_status(f"Opening {path}: {len(book)} rows")
+
+    def on_done(elapsed):
+        global opening
+        opening = False
+        set_status(f"Opened {path} with journal: {len(book)} contacts")
+        maybe_compact()
+
+    def on_cancel():
+        global opening, partial
+        opening, partial = False, True
+        set_status(f"Stopped opening {path} after {len(book)} rows; "
+                   "load or clear the book to edit it.")
+
+    start_io(batches(), on_step, on_done, on_cancel)
+
+def maybe_compact():
+    # Fold the journal into a fresh snapshot once it has grown large enough;
+    # runs in slices like a save, and never on top of another load or save
+    if journal is None or io_busy() or not journal.needs_compaction():
+        return
+    snapshot = book.snapshot()
+
+    def on_step(written):
+        set_status(f"Compacting journal: {written / max(len(snapshot), 1):.0%}")
+
+    def on_done(elapsed):
+        set_status(f"Journal compacted into {journal.path} "
+                   f"({rate(len(snapshot), elapsed)})")
+
+    def on_cancel():
+        set_status("Compaction cancelled; the journal is kept.")
+
+    start_io(journal.compact_steps(snapshot, IO_BATCH), on_step, on_done, on_cancel)
+
+def open_watch(path):
+    # Load the file, then poll its mtime and size; when another program
+    # changes it, only the rows that differ are applied to the book
+    global watch_path, watch_signature
+    watch_path = path
+    watch_signature = file_signature(path)
+    load_file(path)
+    root.after(WATCH_MS, poll_watch)
+
+def poll_watch():
+    global watch_signature
+    signature = file_signature(watch_path)
+    # A missing file is left alone rather than emptying the book
+    if (signature is not None and signature != watch_signature
+            and not io_busy() and not executor.busy("watch")):
+        watch_signature = signature
+        # Read and diffed on a worker, against a copy of the book as it is now
+        old = dict(book.contacts)
+        generation = book.query_cache.generation
+        executor.submit("watch", lambda token, emit: diff_contacts(old, iter_contacts(watch_path)),
+                        lambda changes: apply_file_changes(changes, generation),
+                        on_error=report_error)
+    root.after(WATCH_MS, poll_watch)
+
+def apply_file_changes(changes, generation):
+    # The file is the source of truth: the book is made to match it
+    global watch_signature
+    if generation != book.query_cache.generation or io_busy():
+        # The book changed while the file was read; diff it again
+        watch_signature = None
+        return
+    inserts, updates, deletes = changes
+    if not (inserts or updates or deletes):
+        return
+    selected = contact_list.selected_item()
+    with metrics.measure("apply_file_changes", len(inserts) + len(updates) + len(deletes)):
+        remove_contacts(deletes)
+        for key, contact in updates:
+            book.update(key, contact)
+        if updates:
+            book_changed()
+            contact_list.refresh()
+        if inserts:
+            append_contacts(inserts)
+        reselect(selected)
+    set_status(f"{watch_path} changed: {len(inserts)} added, {len(updates)} updated, "
+               f"{len(deletes)} removed")
+    if view_keys is not book.order:
+        # Filter the changed rows the same way as the rest
+        search_contacts(refresh=True)
+
+def reselect(key):
+    # Puts the selection back on the contact, wherever the view now has it
+    position = None
+    if key in book:
+        if view_keys is book.order:
+            position = book.order.rank(key)
+        else:
+            try:
+                position = view_keys.index(key)
+            except ValueError:
+                pass    # filtered out
+    contact_list.select(position)
+
+def open_view(path):
+    # Map a CSV read-only; rows are decoded only as they are shown or matched
+    global book, read_only, view_cache
+    start = time.perf_counter()
+    book = MappedContacts(path)
+    read_only = True
+    # The file never changes, so cached scans stay valid
+    view_cache = QueryCache(book.search)
+    show_keys(range(len(book)))
+    set_status(f"Viewing {path} read-only: {len(book)} contacts "
+               f"({rate(len(book), time.perf_counter() - start)})")
+
+def schedule_search(event=None):
+    global search_job
+    if search_job is not None:
+        root.after_cancel(search_job)
+    search_job = root.after(SEARCH_DELAY_MS, search_contacts)
+
+def search_contacts(event=None, refresh=False):
+    # refresh re-runs the search after the book changed underneath it,
+    # keeping the selection and the status message
+    global search_job
+    if search_job is not None:
+        root.after_cancel(search_job)
+        search_job = None
+    # Normalized by the searches themselves; shown as typed
+    query = search_entry.get().strip()
+    # Tk variables are read here; the worker only sees plain values
+    fuzzy = fuzzy_var.get() and query
+    distance = int(distance_var.get())
+    searched = book
+    cache = view_cache if read_only else book.query_cache
+    started = time.perf_counter()
+
+    def work(token, emit):
+        # The scans check the token, so a search superseded by the next
+        # keystroke stops instead of running to the end
+        if read_only:
+            return cache.search(query, token)
+        # Fuzzy matches come closest names first, within the chosen number
+        # of typos; anything else in name order
+        return searched.find(query, fuzzy, distance, token)
+
+    def on_done(keys):
+        selected = contact_list.selected_item()
+        # book.order and a --view's unfiltered range are shown as they are
+        unfiltered = isinstance(keys, range) or (not read_only and keys is searched.order)
+        show_keys(keys if unfiltered else array("q", keys))
+        # From the request to the results on screen, as the user waits for it
+        metrics.record("search_contacts (GUI)", time.perf_counter() - started, len(keys))
+        if refresh:
+            reselect(selected)
+        elif cache is None:
+            set_status(f"Search results for: {query} ({len(keys)})")
+        else:
+            set_status(f"Search results for: {query} ({len(keys)}); "
+                       f"cache hit rate {cache.stats()['hit_rate']:.0%}")
+
+    # Replaces any search still running; its results are dropped
+    executor.submit("search", work, on_done, on_error=report_error)
+
+def show_keys(keys):
+    # Only the visible rows are rendered, so swapping views is O(1) in Tk
+    global view_keys
+    with metrics.measure("show_keys", len(keys)):
+        view_keys = keys
+        contact_list.set_items(view_keys)
+
+def render_key(key):
+    return str(book[key])
 
 def on_select(event):
-    if not contact_listbox.curselection():
+    key = contact_list.selected_item()
+    if key is None:
         return
-    index = contact_listbox.curselection()[0]
-    selected = contacts[index].split(" | ")
+    selected = book[key]
     name_entry.delete(0, tk.END)
-    name_entry.insert(0, selected[0])
+    name_entry.insert(0, selected.name)
     address_entry.delete(0, tk.END)
-    address_entry.insert(0, selected[1])
+    address_entry.insert(0, selected.address)
     phone_entry.delete(0, tk.END)
-    phone_entry.insert(0, selected[2])
+    phone_entry.insert(0, selected.phone)
 
 def update_contact():
-    index = contact_listbox.curselection()
-    if not index:
+    if not editable():
+        return
+    key = contact_list.selected_item()
+    if key is None:
         messagebox.showinfo("Edit Contact", "Select a contact to update.")
         return
-    name = name_entry.get().strip()
-    address = address_entry.get().strip()
-    phone = phone_entry.get().strip()
-    if not name or not phone:
-        messagebox.showwarning("Input Error", "Name and phone are required.")
+    new_contact = read_fields()
+    if new_contact is None or not confirm_duplicate(new_contact, key):
         return
-    new_contact = f"{name} | {address} | {phone}"
-    contacts[index[0]] = new_contact
-    contact_listbox.delete(index)
-    contact_listbox.insert(index, new_contact)
-    status_label.config(text=f"Updated: {name}")
+    with metrics.measure("update_contact", 1):
+        if journal is not None:
+            journal.record_update(journal_row(key), new_contact)
+        book.update(key, new_contact)
+        book_changed()
+        if view_keys is book.order:
+            # A new name can move the contact; keep it selected where it lands
+            contact_list.select(book.order.rank(key))
+        else:
+            contact_list.refresh()
+    set_status(f"Updated: {new_contact.name}")
+    maybe_compact()
 
 # --- GUI Setup ---
-root = tk.Tk()
-root.title("Address Book")
-
-# Use a dedicated frame for clean layout
-form_frame = tk.Frame(root)
-form_frame.grid(row=0, column=0, padx=10, pady=10)
-
-# Input Fields
-tk.Label(form_frame, text="Name:").grid(row=0, column=0, sticky="e", padx=5, pady=2)
-tk.Label(form_frame, text="Address:").grid(row=1, column=0, sticky="e", padx=5, pady=2)
-tk.Label(form_frame, text="Phone:").grid(row=2, column=0, sticky="e", padx=5, pady=2)
-
-name_entry = tk.Entry(form_frame, width=40)
-address_entry = tk.Entry(form_frame, width=40)
-phone_entry = tk.Entry(form_frame, width=40)
-
-name_entry.grid(row=0, column=1, padx=5, pady=2)
-address_entry.grid(row=1, column=1, padx=5, pady=2)
-phone_entry.grid(row=2, column=1, padx=5, pady=2)
-
-# Buttons (aligned in a row)
-button_frame = tk.Frame(root)
-button_frame.grid(row=1, column=0, pady=5)
-
-tk.Button(button_frame, text="Add", width=15, command=add_contact).grid(row=0, column=0, padx=2)
-tk.Button(button_frame, text="Update", width=15, command=update_contact).grid(row=0, column=1, padx=2)
-tk.Button(button_frame, text="Clear All", width=15, command=clear_contacts).grid(row=0, column=2, padx=2)
-tk.Button(button_frame, text="Save", width=15, command=save_contacts).grid(row=0, column=3, padx=2)
-tk.Button(button_frame, text="Load", width=15, command=load_contacts).grid(row=0, column=4, padx=2)
-
-# Search bar
-search_frame = tk.Frame(root)
-search_frame.grid(row=2, column=0, pady=(5, 0))
-search_entry = tk.Entry(search_frame, width=30)
-search_entry.pack(side="left", padx=5)
-search_entry.bind("<Return>", search_contacts)
-tk.Button(search_frame, text="Search", command=search_contacts).pack(side="left")
-
-# Contact list
-contact_listbox = tk.Listbox(root, width=70, height=10)
-contact_listbox.grid(row=3, column=0, padx=10, pady=5)
-contact_listbox.bind("<<ListboxSelect>>", on_select)
-
-# Status
-status_label = tk.Label(root, text="", anchor="w", fg="darkgreen")
-status_label.grid(row=4, column=0, sticky="we", padx=10, pady=(0, 5))
-
-root.mainloop()
\ No newline at end of file
+# Built by build_gui() rather than at import time, so the functions above
+# can be imported without creating a window
+root = None
+
+def build_gui():
+    global root, name_entry, address_entry, phone_entry, search_entry
+    global fuzzy_var, distance_var, contact_list, status_label
+    root = tk.Tk()
+    root.title("Address Book")
+
+    # Use a dedicated frame for clean layout
+    form_frame = tk.Frame(root)
+    form_frame.grid(row=0, column=0, padx=10, pady=10)
+
+    # Input Fields
+    tk.Label(form_frame, text="Name:").grid(row=0, column=0, sticky="e", padx=5, pady=2)
+    tk.Label(form_frame, text="Address:").grid(row=1, column=0, sticky="e", padx=5, pady=2)
+    tk.Label(form_frame, text="Phone:").grid(row=2, column=0, sticky="e", padx=5, pady=2)
+
+    name_entry = tk.Entry(form_frame, width=40)
+    address_entry = tk.Entry(form_frame, width=40)
+    phone_entry = tk.Entry(form_frame, width=40)
+
+    name_entry.grid(row=0, column=1, padx=5, pady=2)
+    address_entry.grid(row=1, column=1, padx=5, pady=2)
+    phone_entry.grid(row=2, column=1, padx=5, pady=2)
+
+    # Buttons (aligned in a row)
+    button_frame = tk.Frame(root)
+    button_frame.grid(row=1, column=0, pady=5)
+
+    tk.Button(button_frame, text="Add", width=15, command=add_contact).grid(row=0, column=0, padx=2)
+    tk.Button(button_frame, text="Update", width=15, command=update_contact).grid(row=0, column=1, padx=2)
+    tk.Button(button_frame, text="Clear All", width=15, command=clear_contacts).grid(row=0, column=2, padx=2)
+    tk.Button(button_frame, text="Save", width=15, command=save_contacts).grid(row=0, column=3, padx=2)
+    tk.Button(button_frame, text="Load", width=15, command=load_contacts).grid(row=0, column=4, padx=2)
+    tk.Button(button_frame, text="Cancel", width=15, command=cancel_io).grid(row=0, column=5, padx=2)
+
+    # Search bar
+    search_frame = tk.Frame(root)
+    search_frame.grid(row=2, column=0, pady=(5, 0))
+    search_entry = tk.Entry(search_frame, width=30)
+    search_entry.pack(side="left", padx=5)
+    search_entry.bind("<Return>", search_contacts)
+    search_entry.bind("<KeyRelease>", schedule_search)
+    tk.Button(search_frame, text="Search", command=search_contacts).pack(side="left")
+    fuzzy_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(search_frame, text="Fuzzy names, max typos:", variable=fuzzy_var,
+                   command=search_contacts).pack(side="left", padx=(10, 0))
+    distance_var = tk.StringVar(value="2")
+    tk.Spinbox(search_frame, from_=1, to=3, width=2, textvariable=distance_var, state="readonly",
+               command=search_contacts).pack(side="left")
+
+    # Contact list
+    contact_list = VirtualList(root, view_keys, render=render_key, width=70, height=10)
+    contact_list.grid(row=3, column=0, padx=10, pady=5)
+    contact_list.bind("<<ListboxSelect>>", on_select)
+
+    # Status
+    status_label = tk.Label(root, text="", anchor="w", fg="darkgreen")
+    status_label.grid(row=4, column=0, sticky="we", padx=10, pady=(0, 5))
+    poll_background()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Address book")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--db", help="SQLite file to keep the book in; edits are committed as they are made")
+    source.add_argument("--view", help="CSV file to browse and search read-only through a memory map")
+    source.add_argument("--journal", help="CSV snapshot to keep the book in; edits are appended to a journal")
+    source.add_argument("--watch", help="contacts file to show read-only and keep in sync as other programs change it")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="time operations, show the latest in the status bar, write JSON on exit")
+    args = parser.parse_args(argv)
+    metrics.enabled = bool(args.metrics)
+    build_gui()
+    if args.db:
+        open_store(args.db)
+    elif args.view:
+        open_view(args.view)
+    elif args.journal:
+        open_journal(args.journal)
+    elif args.watch:
+        open_watch(args.watch)
+    root.mainloop()
+    if args.metrics:
+        metrics.dump(args.metrics)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# contacts_cli.py
+# Headless address-book operations over CSV files; never imports tkinter.
+# Input and output are streamed, so files of any size run in small memory.
+# Files may be CSV, JSON Lines (.jsonl), vCard (.vcf) or snapshots (.cbk).
+# Run: python contacts_cli.py {import,export,search,count,dedupe} ...
+import argparse
+import os
+import sys
+import tempfile
+from functools import partial
+from contacts_logic import (batch_writer, format_json_line, format_vcard, iter_contacts,
+                            iter_dedupe, iter_search_contacts, make_contact, write_csv_batches,
+                            write_csv_rows, write_jsonl_batches, write_text_rows,
+                            write_vcard_batches)
+
+ROW_WRITERS = {"csv": write_csv_rows,
+               "jsonl": partial(write_text_rows, format_row=format_json_line),
+               "vcard": partial(write_text_rows, format_row=format_vcard)}
+BATCH_WRITERS = {"csv": write_csv_batches, "jsonl": write_jsonl_batches,
+                 "vcard": write_vcard_batches}
+
+def validated(contacts, rejected):
+    # Strips fields and applies the make_contact rules; rejected rows are
+    # collected as (row number, contact, reason)
+    for row, contact in enumerate(contacts, 1):
+        try:
+            yield make_contact(*((field or "").strip() for field in contact))
+        except ValueError as e:
+            rejected.append((row, contact, str(e)))
+
+def write_output(contacts, path, output_format=None):
+    # To a file atomically, or to stdout when no path is given. Without a
+    # format, files get the one their extension names and stdout gets CSV.
+    if path is None:
+        return ROW_WRITERS[output_format or "csv"](sys.stdout, contacts)
+    write = BATCH_WRITERS[output_format] if output_format else batch_writer(path)
+    written = 0
+    for written in write(path, contacts, 10_000):
+        pass
+    return written
+
+def cmd_import(args):
+    rejected = []
+    if args.workers:
+        written, rejected = parallel_import(args)
+    else:
+        contacts = validated(iter_contacts(args.file), rejected)
+        written = write_output(contacts, args.output, args.format)
+    for row, fields, reason in rejected:
+        print(f"row {row}: {reason} {list(fields)}", file=sys.stderr)
+    print(f"{written} imported, {len(rejected)} rejected", file=sys.stderr)
+
+def parallel_import(args):
+    # The workers write clean CSV; a CSV output file gets it directly, any
+    # other output is converted from a temporary copy. Imported lazily to
+    # keep startup fast.
+    from contacts_import import import_csv
+    csv_output = args.output is not None and (
+        args.format == "csv" if args.format else batch_writer(args.output) is write_csv_batches)
+    if csv_output:
+        result = import_csv(args.file, args.output, args.workers)
+        return result.accepted, result.rejected
+    fd, clean_path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        result = import_csv(args.file, clean_path, args.workers)
+        return write_output(iter_contacts(clean_path), args.output, args.format), result.rejected
+    finally:
+        os.remove(clean_path)
+
+def cmd_export(args):
+    contacts = iter_contacts(args.file)
+    if args.query is not None:
+        contacts = iter_search_contacts(contacts, args.query)
+    write_output(contacts, args.output, args.format)
+
+def cmd_search(args):
+    for contact in iter_search_contacts(iter_contacts(args.file), args.query):
+        print(contact)
+
+def cmd_count(args):
+    contacts = iter_contacts(args.file)
+    if args.query is not None:
+        contacts = iter_search_contacts(contacts, args.query)
+    print(sum(1 for _ in contacts))
+
+def cmd_dedupe(args):
+    seen = 0
+
+    def counted(contacts):
+        nonlocal seen
+        for seen, contact in enumerate(contacts, 1):
+            yield contact
+
+    written = write_output(iter_dedupe(counted(iter_contacts(args.file))), args.output,
+                           args.format)
+    print(f"{written} kept, {seen - written} duplicates removed", file=sys.stderr)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless address book tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("import", help="validate and normalize a contact dump")
+    p.add_argument("file")
+    p.add_argument("-o", "--output", help="file to write (default: stdout)")
+    p.add_argument("-f", "--format", choices=ROW_WRITERS, help="output format")
+    p.add_argument("--workers", type=int, help="parse in this many processes")
+    p.set_defaults(func=cmd_import)
+
+    p = commands.add_parser("export", help="write contacts, optionally filtered")
+    p.add_argument("file")
+    p.add_argument("-o", "--output", help="file to write (default: stdout)")
+    p.add_argument("-f", "--format", choices=ROW_WRITERS, help="output format")
+    p.add_argument("-q", "--query", help="only contacts matching this search")
+    p.set_defaults(func=cmd_export)
+
+    p = commands.add_parser("search", help="print contacts matching a query")
+    p.add_argument("file")
+    p.add_argument("query")
+    p.set_defaults(func=cmd_search)
+
+    p = commands.add_parser("count", help="count contacts")
+    p.add_argument("file")
+    p.add_argument("-q", "--query", help="only count contacts matching this search")
+    p.set_defaults(func=cmd_count)
+
+    p = commands.add_parser("dedupe", help="drop contacts whose phone was already seen")
+    p.add_argument("file")
+    p.add_argument("-o", "--output", help="file to write (default: stdout)")
+    p.add_argument("-f", "--format", choices=ROW_WRITERS, help="output format")
+    p.set_defaults(func=cmd_dedupe)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.func(args)
+    except BrokenPipeError:
+        # Output piped into e.g. head, which stopped reading
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
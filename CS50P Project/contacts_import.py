@@ -0,0 +1,120 @@
+# contacts_import.py
+# Bulk import of large contact dumps. The CSV is split into byte ranges on
+# row boundaries, each range is parsed and validated in a worker process
+# with the contacts_logic rules, and the results are merged in file order.
+# Workers send back their accepted rows as CSV bytes rather than Contact
+# objects, so the parent only concatenates them instead of unpickling and
+# re-encoding every row.
+# Run: python contacts_import.py FILE [--workers N] [--out CLEAN.csv]
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contacts_logic import CSV_HEADER, make_contact
+
+CHUNK_BYTES = 4 * 1024 * 1024
+
+ImportResult = namedtuple("ImportResult", "accepted rejected rows seconds")
+# accepted is a count, as the contacts themselves go to the output file;
+# rejected holds (row number, fields, reason); row 1 is the first data row
+
+def read_header(path):
+    # Returns the column of each CSV_HEADER field and where the data starts
+    with open(path, "rb") as file:
+        line = file.readline()
+        header = next(csv.reader([line.decode("utf-8-sig")]), None) or CSV_HEADER
+        return [header.index(field) for field in CSV_HEADER], file.tell()
+
+def split_ranges(path, data_start, chunk_bytes=CHUNK_BYTES):
+    # Byte ranges that each start and end on a row boundary. A quoted field
+    # may hold a newline, so a range only ends at a newline with an even
+    # number of quotes since its start; "" escapes count twice and keep the
+    # parity. Counting quotes per block is one quick read of the file.
+    size = os.path.getsize(path)
+    bounds = [data_start]
+    with open(path, "rb") as file:
+        while bounds[-1] + chunk_bytes < size:
+            file.seek(bounds[-1])
+            quotes = file.read(chunk_bytes).count(b'"')
+            while line := file.readline():
+                quotes += line.count(b'"')
+                if not quotes % 2:
+                    break
+            if file.tell() >= size:
+                break
+            bounds.append(file.tell())
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def parse_range(path, start, end, columns):
+    # Runs in a worker: returns the valid contacts as UTF-8 CSV rows, how
+    # many there are, the rejected rows with their position inside this
+    # range, and the number of rows seen.
+    with open(path, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode("utf-8")
+    out = io.StringIO(newline="")
+    writer = csv.writer(out)
+    accepted, rejected = 0, []
+    rows = 0
+    for fields in csv.reader(io.StringIO(text, newline="")):
+        if not fields:
+            continue
+        rows += 1
+        values = [fields[c].strip() if c < len(fields) else "" for c in columns]
+        try:
+            writer.writerow(make_contact(*values))
+        except ValueError as e:
+            rejected.append((rows, fields, str(e)))
+        else:
+            accepted += 1
+    return out.getvalue().encode("utf-8"), accepted, rejected, rows
+
+def import_csv(path, out=None, workers=None, chunk_bytes=CHUNK_BYTES):
+    # Validates path into a clean CSV at out, which is only replaced once
+    # every range is written. Without out the rows are just checked.
+    start = time.perf_counter()
+    columns, data_start = read_header(path)
+    ranges = split_ranges(path, data_start, chunk_bytes)
+    accepted, rejected = 0, []
+    rows = 0
+    tmp_path = out + ".tmp" if out else os.devnull
+    try:
+        with open(tmp_path, "wb") as file, ProcessPoolExecutor(max_workers=workers) as pool:
+            header = io.StringIO(newline="")
+            csv.writer(header).writerow(CSV_HEADER)
+            file.write(header.getvalue().encode("utf-8"))
+            # map() yields in submission order, which keeps the file order
+            results = pool.map(parse_range, *zip(*[(path, a, b, columns) for a, b in ranges]))
+            for data, chunk_accepted, chunk_rejected, chunk_rows in results:
+                file.write(data)
+                accepted += chunk_accepted
+                rejected.extend((rows + n, fields, reason) for n, fields, reason in chunk_rejected)
+                rows += chunk_rows
+        if out:
+            os.replace(tmp_path, out)
+    finally:
+        if out and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return ImportResult(accepted, rejected, rows, time.perf_counter() - start)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel import of a contacts CSV")
+    parser.add_argument("file")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--out", help="write the accepted contacts to this CSV")
+    args = parser.parse_args(argv)
+
+    result = import_csv(args.file, args.out, args.workers)
+    rate = result.rows / result.seconds if result.seconds else 0
+    print(f"{result.rows} rows in {result.seconds:.2f}s ({rate:,.0f} rows/s), "
+          f"{result.accepted} accepted, {len(result.rejected)} rejected")
+    for row, fields, reason in result.rejected:
+        print(f"  row {row}: {reason} {fields}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# contacts_journal.py
+# Journaled persistence: contacts.csv is a snapshot and every edit is
+# appended as one JSON line to contacts.csv.journal. Loading reads the
+# snapshot and replays the journal; compaction writes a fresh snapshot
+# atomically and drops the journal.
+#
+# Records name absolute positions ("set row 3", not "append"). Before a
+# compaction moves the journal aside, it appends a base record naming the
+# snapshot file the journal applies to (inode, mtime, size). Once the new
+# snapshot has replaced that file the old journal no longer matches and is
+# skipped, so a crash at any point during compaction loses nothing and
+# replays nothing twice.
+import json
+import os
+from contacts_logic import Contact, iter_csv_batches, write_csv_batches
+
+ADD, UPDATE, CLEAR, BASE = "A", "U", "C", "B"
+
+class Journal:
+    def __init__(self, path, min_bytes=1 << 20, ratio=0.5, sync=False):
+        self.path = path
+        self.log_path = path + ".journal"
+        # Holds the journal being folded into the snapshot by a compaction
+        self.old_path = self.log_path + ".old"
+        self.min_bytes = min_bytes
+        self.ratio = ratio
+        self.sync = sync
+        drop_partial_record(self.log_path)
+        self.file = open(self.log_path, "a", encoding="utf-8")
+
+    def load(self):
+        contacts = []
+        if os.path.exists(self.path):
+            for batch, _ in iter_csv_batches(self.path, 10_000):
+                contacts.extend(batch)
+        if journal_base(self.old_path) in (None, snapshot_id(self.path)):
+            replay(self.old_path, contacts)
+        replay(self.log_path, contacts)
+        return contacts
+
+    def record_add(self, position, contact):
+        self.append([ADD, position, *contact])
+
+    def record_update(self, position, contact):
+        self.append([UPDATE, position, *contact])
+
+    def record_adds(self, first, contacts):
+        # Many rows at once, e.g. while loading a CSV: one write and flush
+        self.append(*([ADD, first + i, *c] for i, c in enumerate(contacts)))
+
+    def record_clear(self):
+        self.append([CLEAR])
+
+    def append(self, *records):
+        self.file.write("".join(
+            json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records))
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+
+    def needs_compaction(self):
+        snapshot = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return self.file.tell() > max(self.min_bytes, snapshot * self.ratio)
+
+    def compact_steps(self, contacts, batch_size=1000):
+        # Returns a generator for chunked callers that yields rows written.
+        # The journal is moved aside before this returns, so edits recorded
+        # from then on go to a fresh journal and survive the compaction.
+        self.append([BASE, *snapshot_id(self.path)])
+        self.file.close()
+        if journal_base(self.old_path) not in (None, snapshot_id(self.path)):
+            # Left by a compaction that died after replacing the snapshot
+            os.remove(self.old_path)
+        if os.path.exists(self.old_path):
+            # An earlier compaction died; fold the journal into its leftovers
+            with open(self.old_path, "a", encoding="utf-8") as old, \
+                    open(self.log_path, encoding="utf-8") as log:
+                old.write(log.read())
+            os.remove(self.log_path)
+        elif os.path.exists(self.log_path):
+            os.replace(self.log_path, self.old_path)
+        self.file = open(self.log_path, "a", encoding="utf-8")
+        return self._write_snapshot(contacts, batch_size)
+
+    def _write_snapshot(self, contacts, batch_size):
+        yield from write_csv_batches(self.path, contacts, batch_size)
+        os.remove(self.old_path)
+
+    def compact(self, contacts):
+        for _ in self.compact_steps(contacts, 10_000):
+            pass
+
+    def close(self):
+        self.file.close()
+
+def drop_partial_record(path):
+    # A crash mid-write can leave a final line without its newline
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as file:
+        data = file.read()
+        if data and not data.endswith(b"\n"):
+            file.truncate(data.rfind(b"\n") + 1)
+
+def snapshot_id(path):
+    # Changes whenever the snapshot is replaced; empty while there is none
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return []
+    return [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+
+def journal_base(path):
+    # The snapshot id from a journal's last record if it is a base record,
+    # otherwise None (no such file, or never moved aside by a compaction)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        file.seek(max(0, os.path.getsize(path) - 4096))
+        lines = file.read().splitlines()
+    if not lines or not lines[-1].startswith(b'["B"'):
+        return None
+    return json.loads(lines[-1])[1:]
+
+def replay(path, contacts):
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.endswith("\n"):
+                break
+            op, *args = json.loads(line)
+            if op == BASE:
+                continue
+            if op == CLEAR:
+                contacts.clear()
+            elif op in (ADD, UPDATE):
+                position, name, address, phone = args
+                contact = Contact(name, address, phone)
+                if position < len(contacts):
+                    contacts[position] = contact
+                elif position == len(contacts):
+                    contacts.append(contact)
+                else:
+                    raise ValueError(f"{path}: record for row {position} of {len(contacts)}")
@@ -1,12 +1,1305 @@
 # contacts_logic.py
-def format_contact(name, address, phone):
+import codecs
+import csv
+import json
+import os
+import re
+import struct
+import sys
+import threading
+import unicodedata
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from itertools import accumulate, islice
+from contacts_metrics import metrics
+
+SEPARATOR = " | "
+CSV_HEADER = ["Name", "Address", "Phone"]
+NON_DIGITS = re.compile(r"[^0-9]")
+WORD = re.compile(r"\w+")
+NON_ASCII = re.compile(rb"[\x80-\xff]")
+CHECK_EVERY = 4096      # items a cancellable scan handles between token checks
+
+# Binary snapshot: header, then blocks of rows. Each block is a block header
+# and a payload, zlib-compressed when the SNAPSHOT_ZLIB flag is set. A
+# payload holds, per field, an array of little-endian byte lengths followed
+# by the fields' UTF-8 bytes. Lengths take 1, 2 or 4 bytes each, the least
+# that fits the block's longest field. The header's row count and CRC-32
+# of the uncompressed payloads are checked after reading.
+SNAPSHOT_EXT = ".cbk"
+SNAPSHOT_MAGIC = b"CONTACTS"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_ZLIB = 1
+SNAPSHOT_HEADER = struct.Struct("<8sHHQI")   # magic, version, flags, rows, crc32
+SNAPSHOT_BLOCK = struct.Struct("<IIB")       # rows, payload bytes as stored, length width
+SNAPSHOT_LENGTHS = {1: "B", 2: "H", 4: "I"}  # length width -> array typecode
+
+class Contact:
+    # One record per contact; __slots__ drops the per-instance __dict__.
+    # Records are replaced, not modified, when a contact is edited.
+    __slots__ = ("name", "address", "phone", "_search_key")
+
+    def __init__(self, name, address, phone):
+        self.name = name
+        self.address = address
+        self.phone = phone
+
+    @classmethod
+    def from_string(cls, contact_str):
+        # Accepts the old "name | address | phone" display format
+        return cls(*parse_contact(contact_str))
+
+    def __iter__(self):
+        return iter((self.name, self.address, self.phone))
+
+    @property
+    def search_key(self):
+        # fold(str(self)), worked out on first use and kept with the record
+        try:
+            return self._search_key
+        except AttributeError:
+            self._search_key = fold(str(self))
+            return self._search_key
+
+    def __reduce__(self):
+        # Much cheaper to pickle than the default for slotted classes, which
+        # matters when records come back from worker processes
+        return Contact, (self.name, self.address, self.phone)
+
+    def __eq__(self, other):
+        if not isinstance(other, Contact):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return f"Contact({self.name!r}, {self.address!r}, {self.phone!r})"
+
+    def __str__(self):
+        return SEPARATOR.join(self)
+
+def make_contact(name, address, phone):
     if not name or not phone:
         raise ValueError("Name and phone are required.")
-    return f"{name} | {address} | {phone}"
+    return Contact(name, address, phone)
+
+def format_contact(name, address, phone):
+    return str(make_contact(name, address, phone))
 
 def parse_contact(contact_str):
-    return contact_str.split(" | ")
+    return contact_str.split(SEPARATOR)
+
+def fold(text):
+    # Search form of text: casefolded, NFKD-decomposed and without
+    # combining marks, so "JOSÉ", "José" and "jose" all become "jose"
+    if text.isascii():
+        return text.lower()
+    return "".join(ch for ch in unicodedata.normalize("NFKD", text.casefold())
+                   if not unicodedata.combining(ch))
+
+def normalize_query(query):
+    return fold(query.strip())
 
+def search_key(contact):
+    # Also accepts legacy "name | address | phone" strings
+    return contact.search_key if isinstance(contact, Contact) else fold(contact)
+
+@metrics.timed(items=len)
 def search_contacts(contacts, query):
-    query = query.strip().lower()
-    return [c for c in contacts if query in c.lower()]
+    # Works on Contact records as well as legacy display strings
+    return list(iter_search_contacts(contacts, query))
+
+def iter_search_contacts(contacts, query):
+    # Streaming form of search_contacts
+    query = normalize_query(query)
+    return (c for c in contacts if query in search_key(c))
+
+def checked(items, token=None, size=CHECK_EVERY):
+    # Slices of the sequence items, calling token.check() before each one,
+    # so a scan on a worker thread stops soon after its search is cancelled
+    for start in range(0, len(items), size):
+        if token is not None:
+            token.check()
+        yield items[start:start + size]
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TrigramIndex:
+    # Maps character trigrams of each contact's search key to the keys
+    # (list positions or IDs) of the contacts containing them. Searches only
+    # copy or look up shared containers, never iterate them, so they can run
+    # on a worker thread while another thread edits the index. Pass text to
+    # index something other than the whole record, e.g. a single field.
+    def __init__(self, contacts=(), text=search_key):
+        self._postings = {}
+        self._texts = {}
+        self._text = text
+        for key, contact in enumerate(contacts):
+            self.add(key, contact)
+
+    def __len__(self):
+        return len(self._texts)
+
+    def add(self, key, contact):
+        text = self._text(contact)
+        self._texts[key] = text
+        for gram in trigrams(text):
+            self._postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        text = self._texts.pop(key)
+        for gram in trigrams(text):
+            posting = self._postings[gram]
+            posting.discard(key)
+            if not posting:
+                del self._postings[gram]
+
+    def update(self, key, contact):
+        self.remove(key)
+        self.add(key, contact)
+
+    def clear(self):
+        self._postings.clear()
+        self._texts.clear()
+
+    @metrics.timed(items=len)
+    def search(self, query, token=None):
+        # Same matches as search_contacts, returned as sorted keys. A token
+        # lets a search on a worker thread be cancelled part way.
+        query = normalize_query(query)
+        grams = trigrams(query)
+        if not grams:
+            # Queries shorter than a trigram fall back to a scan
+            items = list(self._texts.items())
+            return sorted(k for chunk in checked(items, token) for k, text in chunk if query in text)
+        postings = sorted((self._postings.get(g, set()) for g in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                return []
+        # Trigrams only prove each piece is present, so verify the substring
+        texts = self._texts
+        return sorted(k for chunk in checked(list(candidates), token)
+                      for k in chunk if query in texts.get(k, ""))
+
+    def estimate(self, query):
+        # Upper bound on the matches, from the rarest trigram's posting
+        grams = trigrams(normalize_query(query))
+        if not grams:
+            return len(self._texts)
+        return min(len(self._postings.get(g, ())) for g in grams)
+
+    def filter(self, keys, query, token=None):
+        # Re-check only the given keys (a sequence), keeping their order
+        query = normalize_query(query)
+        texts = self._texts
+        return [k for chunk in checked(keys, token) for k in chunk if query in texts.get(k, "")]
+
+class IncrementalSearch:
+    # Search-as-you-type: a query that contains the previous one can only
+    # match a subset of its results, so only those are re-checked.
+    def __init__(self, index):
+        self.index = index
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # Call after any change to the indexed contacts
+        with self._lock:
+            self._state = (None, [])
+
+    @metrics.timed(items=len)
+    def search(self, query, token=None):
+        query = normalize_query(query)
+        state = self._state
+        last_query, last_results = state
+        if last_query is not None and last_query in query:
+            results = self.index.filter(last_results, query, token)
+        else:
+            results = self.index.search(query, token)
+        with self._lock:
+            # A reset while this search ran (e.g. on a worker thread) wins
+            if self._state is state:
+                self._state = (query, results)
+        return results
+
+class QueryCache:
+    # Bounded LRU cache of normalized query -> sorted result keys in front
+    # of a search(query, token) function, e.g. IncrementalSearch.search. Every
+    # change bumps the generation, and a result computed before the latest
+    # change, or a search cancelled through its token, is never stored.
+    # changed() patches one added or edited contact into
+    # the cached results that its old or new record matched, so edits keep
+    # the cache warm; invalidate() drops everything, e.g. for a load. Besides
+    # the entry count, the keys held across all entries are capped, so broad
+    # one- or two-letter queries cannot pin near-whole-book lists; a result
+    # larger than the whole budget is returned without being cached.
+    def __init__(self, search, max_entries=256, max_keys=1_000_000):
+        self._search = search
+        self.max_entries = max_entries
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._keys = 0          # total length of the cached lists
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = self.misses = self.patched = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, query, token=None):
+        # Returned lists are shared with the cache; do not modify them
+        query = normalize_query(query)
+        with self._lock:
+            results = self._entries.get(query)
+            if results is not None:
+                self._entries.move_to_end(query)
+                self.hits += 1
+                return results
+            self.misses += 1
+            generation = self.generation
+        results = self._search(query, token)
+        with self._lock:
+            if generation == self.generation and len(results) <= self.max_keys:
+                self._entries[query] = results
+                self._keys += len(results)
+                self._evict()
+        return results
+
+    def _evict(self):
+        # Drops least recently used entries until both limits hold; the
+        # caller holds the lock
+        while len(self._entries) > self.max_entries or self._keys > self.max_keys:
+            self._keys -= len(self._entries.popitem(last=False)[1])
+
+    def changed(self, key, old=None, new=None):
+        # old is None for an added contact; same test as search_contacts
+        old_text = old.search_key if old is not None else None
+        new_text = new.search_key if new is not None else None
+        with self._lock:
+            self.generation += 1
+            for query, results in self._entries.items():
+                was = old_text is not None and query in old_text
+                now = new_text is not None and query in new_text
+                if was == now:
+                    continue
+                # Copied, as a caller may still be reading the old list
+                results = list(results)
+                if now:
+                    insort(results, key)
+                    self._keys += 1
+                else:
+                    results.remove(key)
+                    self._keys -= 1
+                self._entries[query] = results
+                self.patched += 1
+            # Patched-in keys count against max_keys like searched ones
+            self._evict()
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._keys = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "patched": self.patched,
+                "entries": len(self._entries), "keys": self._keys,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+class AhoCorasick:
+    # Automaton over many patterns that finds all of them in one pass over
+    # a text. Node 0 is the root; out[node] lists every pattern ending there,
+    # including those inherited through failure links.
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        for number, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                node = nxt
+            self.out[node] += (number,)
+        # Breadth-first so each node's failure target is finished before it
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for ch, child in self.goto[node].items():
+                target = self.fail[node]
+                while target and ch not in self.goto[target]:
+                    target = self.fail[target]
+                self.fail[child] = self.goto[target].get(ch, 0)
+                self.out[child] += self.out[self.fail[child]]
+                queue.append(child)
+
+    def find(self, text):
+        # Numbers of the patterns that occur in text
+        goto, fail, out = self.goto, self.fail, self.out
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+@metrics.timed(items=len)
+def search_many(contacts, queries):
+    # Batch form of search_contacts: one list of matches per query, from a
+    # single pass over each contact's search key. Cost grows with the
+    # data plus the matches rather than the data times the queries.
+    queries = [normalize_query(q) for q in queries]
+    patterns = sorted({q for q in queries if q})
+    number = {pattern: i for i, pattern in enumerate(patterns)}
+    automaton = AhoCorasick(patterns)
+    matches = [[] for _ in patterns]
+    everything = []
+    for contact in contacts:
+        everything.append(contact)
+        for i in automaton.find(search_key(contact)):
+            matches[i].append(contact)
+    return [matches[number[q]] if q else list(everything) for q in queries]
+
+def normalize_phone(phone):
+    # Digits only, so "(512) 555-0294" and "512.555.0294" compare equal
+    return NON_DIGITS.sub("", phone)
+
+class DuplicateContactError(ValueError):
+    pass
+
+class PhoneIndex:
+    # Maps each normalized phone to the keys of the contacts that have it,
+    # so duplicate checks are a dict lookup instead of a scan.
+    def __init__(self, contacts=()):
+        self._keys = {}
+        self._phones = {}
+        for key, contact in enumerate(contacts):
+            self.add(key, contact)
+
+    def add(self, key, contact):
+        phone = normalize_phone(contact.phone)
+        self._phones[key] = phone
+        if phone:
+            self._keys.setdefault(phone, set()).add(key)
+
+    def remove(self, key):
+        phone = self._phones.pop(key)
+        keys = self._keys.get(phone)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys[phone]
+
+    def update(self, key, contact):
+        self.remove(key)
+        self.add(key, contact)
+
+    def clear(self):
+        self._keys.clear()
+        self._phones.clear()
+
+    def find(self, phone):
+        return sorted(self._keys.get(normalize_phone(phone), ()))
+
+    def duplicates(self, contact, key=None):
+        # Keys of other contacts with the same phone; pass the contact's own
+        # key when checking an update so it does not match itself
+        phone = normalize_phone(contact.phone)
+        return sorted(k for k in self._keys.get(phone, ()) if k != key) if phone else []
+
+    def check(self, contact, key=None):
+        found = self.duplicates(contact, key)
+        if found:
+            raise DuplicateContactError(f"Phone {contact.phone} is already used.")
+
+# Field names a query may scope a clause to, and the field each means
+QUERY_FIELDS = {"name": "name", "addr": "address", "address": "address", "phone": "phone"}
+QUERY_TERM = re.compile(r'(?:(\w+):)?(?:"((?:[^"]|"")*)"?|(\S+))')
+
+def parse_query(query):
+    # 'name:ka phone:512 OR addr:"oak st"' -> [[("name", "ka"), ("phone", "512")],
+    # [("address", "oak st")]]: a list of OR'ed groups of AND'ed (field, value)
+    # clauses. AND is implied between clauses and binds tighter than OR.
+    # Unscoped words run together into one phrase with field None, matched
+    # against the whole record like a plain search; quotes keep spaces and
+    # colons in a value, with "" for a literal quote.
+    groups, group, words = [], [], []
+
+    def end_phrase():
+        if words:
+            group.append((None, " ".join(words)))
+            words.clear()
+
+    for match in QUERY_TERM.finditer(query):
+        field, quoted, word = match.groups()
+        if field is not None and field.lower() not in QUERY_FIELDS:
+            # e.g. "12:30" or "http://..." is just text
+            field, quoted, word = None, None, match.group()
+        if field is None and quoted is None:
+            if word in ("AND", "OR"):
+                end_phrase()
+                if word == "OR" and group:
+                    groups.append(group)
+                    group = []
+            else:
+                words.append(word)
+            continue
+        end_phrase()
+        value = quoted.replace('""', '"') if quoted is not None else word
+        group.append((QUERY_FIELDS[field.lower()] if field else None, value))
+    end_phrase()
+    if group:
+        groups.append(group)
+    return groups
+
+def is_field_query(query):
+    # False for plain text (no fields, operators or quotes), which the
+    # ordinary substring search already answers
+    groups = parse_query(query)
+    return bool(groups) and groups != [[(None, " ".join(query.split()))]]
+
+class FieldIndex:
+    # Answers parse_query queries with one TrigramIndex per field, so a
+    # "phone:555" clause never matches a street number. Unscoped phrases go to
+    # the whole-record index passed in, which its owner keeps up to date.
+    # Phones are indexed and queried as digits only, like PhoneIndex.
+    def __init__(self, record_index, contacts=()):
+        self.record_index = record_index
+        self.fields = {"name": TrigramIndex(text=lambda c: fold(c.name)),
+                       "address": TrigramIndex(text=lambda c: fold(c.address)),
+                       "phone": TrigramIndex(text=lambda c: normalize_phone(c.phone))}
+        for key, contact in enumerate(contacts):
+            self.add(key, contact)
+
+    def add(self, key, contact):
+        for index in self.fields.values():
+            index.add(key, contact)
+
+    def remove(self, key):
+        for index in self.fields.values():
+            index.remove(key)
+
+    def update(self, key, contact):
+        for index in self.fields.values():
+            index.update(key, contact)
+
+    def clear(self):
+        for index in self.fields.values():
+            index.clear()
+
+    def clause(self, field, value):
+        # (index, query) answering one clause, or None if nothing can match
+        if field is None:
+            return self.record_index, value
+        if field == "phone":
+            digits = normalize_phone(value)
+            # Phones match by digits, so phone:abc must not match them all
+            return (self.fields[field], digits) if digits or not value.strip() else None
+        return self.fields[field], value
+
+    @metrics.timed(items=len)
+    def search(self, query, token=None):
+        # Sorted keys of the contacts matching any group of the query
+        keys = set()
+        for group in parse_query(query):
+            keys.update(self.search_group(group, token))
+        return sorted(keys)
+
+    def search_group(self, clauses, token=None):
+        # Runs the most selective clause through its index, then only
+        # re-checks those keys against the other clauses
+        clauses = [self.clause(field, value) for field, value in clauses]
+        if None in clauses:
+            return []
+        clauses.sort(key=lambda clause: clause[0].estimate(clause[1]))
+        index, value = clauses[0]
+        keys = index.search(value, token)
+        for index, value in clauses[1:]:
+            if not keys:
+                break
+            keys = index.filter(keys, value, token)
+        return keys
+
+@metrics.timed(items=len)
+def dedupe(contacts):
+    return list(iter_dedupe(contacts))
+
+def iter_dedupe(contacts):
+    # Keeps the first contact for each normalized phone, in order; contacts
+    # without any digits in their phone are always kept
+    seen = set()
+    for contact in contacts:
+        phone = normalize_phone(contact.phone)
+        if not phone or phone not in seen:
+            seen.add(phone)
+            yield contact
+
+def diff_contacts(old, new):
+    # Row-level diff of a mapping key -> Contact against a fresh list of
+    # contacts, e.g. a re-read file. Returns (inserts, updates, deletes):
+    # new contacts, (key, contact) pairs and keys. Unchanged rows match by
+    # value wherever they moved; a changed row is an update of a removed
+    # contact with the same phone, or failing that the same name.
+    unmatched = {}
+    for key, contact in old.items():
+        unmatched.setdefault(tuple(contact), []).append(key)
+    added = []
+    for contact in new:
+        keys = unmatched.get(tuple(contact))
+        if keys:
+            keys.pop()
+        else:
+            added.append(contact)
+    removed = [key for keys in unmatched.values() for key in keys]
+    by_phone, by_name = {}, {}
+    for key in removed:
+        phone = normalize_phone(old[key].phone)
+        if phone:
+            by_phone.setdefault(phone, []).append(key)
+        by_name.setdefault(fold(old[key].name), []).append(key)
+    inserts, updates, paired = [], [], set()
+    for contact in added:
+        key = None
+        for keys in (by_phone.get(normalize_phone(contact.phone)), by_name.get(fold(contact.name))):
+            while keys and key is None:
+                key = keys.pop()
+                if key in paired:
+                    key = None
+        if key is None:
+            inserts.append(contact)
+        else:
+            paired.add(key)
+            updates.append((key, contact))
+    return inserts, updates, [key for key in removed if key not in paired]
+
+def file_signature(path):
+    # (mtime, size), which a watcher compares to notice changes without
+    # reading the file; None while it does not exist
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def edit_distance(a, b, limit=None):
+    # Levenshtein distance; once every cell of a row exceeds limit the
+    # answer is known to exceed it too and limit + 1 is returned
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        left = i
+        for j, cb in enumerate(b):
+            # Inlined min() of substitute, delete and insert: about 2x faster
+            cost = previous[j] + (ca != cb)
+            if previous[j + 1] + 1 < cost:
+                cost = previous[j + 1] + 1
+            if left + 1 < cost:
+                cost = left + 1
+            current.append(cost)
+            left = cost
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+class BKTree:
+    # Burkhard-Keller tree of words under edit distance. A lookup only
+    # descends into children whose edge distance is within max_distance of
+    # the distance to the current node, which skips most of the tree.
+    def __init__(self, words=()):
+        self._root = None
+        self._size = 0
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, word):
+        if self._root is None:
+            self._root = (word, {})
+            self._size = 1
+            return
+        node = self._root
+        while True:
+            d = edit_distance(word, node[0])
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = (word, {})
+                self._size += 1
+                return
+            node = child
+
+    def search(self, word, max_distance, token=None):
+        # (distance, word) pairs within max_distance
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        visited = 0
+        while stack:
+            if token is not None and not visited % CHECK_EVERY:
+                token.check()
+            visited += 1
+            node_word, children = stack.pop()
+            d = edit_distance(word, node_word)
+            if d <= max_distance:
+                found.append((d, node_word))
+            for edge, child in list(children.items()):
+                if d - max_distance <= edge <= d + max_distance:
+                    stack.append(child)
+        return found
+
+def name_tokens(name):
+    return set(WORD.findall(fold(name)))
+
+class FuzzyIndex:
+    # Typo-tolerant name search: a BK-tree over the distinct name tokens and
+    # a map from token to contact keys. BK-trees cannot delete, so tokens no
+    # longer used by any contact stay in the tree and are skipped; clear()
+    # starts a new tree.
+    def __init__(self, contacts=()):
+        self.clear()
+        for key, contact in enumerate(contacts):
+            self.add(key, contact)
+
+    def add(self, key, contact):
+        tokens = name_tokens(contact.name)
+        self._tokens[key] = tokens
+        for token in tokens:
+            if token not in self._keys:
+                self._keys[token] = set()
+                self._tree.add(token)
+            self._keys[token].add(key)
+
+    def remove(self, key):
+        for token in self._tokens.pop(key):
+            self._keys[token].discard(key)
+
+    def update(self, key, contact):
+        self.remove(key)
+        self.add(key, contact)
+
+    def clear(self):
+        self._tree = BKTree()
+        self._keys = {}
+        self._tokens = {}
+
+    @metrics.timed(items=len)
+    def search(self, query, max_distance=2, token=None):
+        # Keys whose name has a token within max_distance of every query
+        # token, closest total distance first
+        best = None
+        for word in name_tokens(query):
+            distances = {}
+            for d, name_token in self._tree.search(word, max_distance, token):
+                for key in tuple(self._keys.get(name_token, ())):
+                    if d < distances.get(key, max_distance + 1):
+                        distances[key] = d
+            if best is None:
+                best = distances
+            else:
+                best = {k: best[k] + d for k, d in distances.items() if k in best}
+            if not best:
+                return []
+        return sorted(best or (), key=lambda k: (best[k], k))
+
+class NameIndex:
+    # Keys in order of folded name, ties broken by key. Entries are
+    # (name, key) pairs kept in sorted chunks of at most CHUNK, so insort
+    # only shifts one chunk; with one flat list every add would move half
+    # the index and loading a big book would be quadratic. index[rank] is
+    # the key at that rank, so the index can back a list view directly.
+    CHUNK = 1000
+
+    def __init__(self, contacts=()):
+        self.clear()
+        for key, contact in enumerate(contacts):
+            self.add(key, contact)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __getitem__(self, rank):
+        if not -len(self) <= rank < len(self):
+            raise IndexError("rank out of range")
+        rank %= len(self)
+        starts = self._chunk_starts()
+        i = bisect_right(starts, rank) - 1
+        return self._chunks[i][rank - starts[i]][1]
+
+    def _chunk_starts(self):
+        # Rank of each chunk's first entry; rebuilt after any change
+        if self._starts is None:
+            self._starts = list(accumulate((len(c) for c in self._chunks), initial=0))
+        return self._starts
+
+    def __iter__(self):
+        for chunk in list(self._chunks):
+            for _, key in list(chunk):
+                yield key
+
+    def add(self, key, contact):
+        self.add_name(key, fold(contact.name))
+
+    def add_name(self, key, name):
+        # name already folded, e.g. read back from a database
+        entry = (name, key)
+        self._names[key] = name
+        chunks, maxes = self._chunks, self._maxes
+        self._starts = None
+        if not chunks:
+            chunks.append([entry])
+            maxes.append(entry)
+            return
+        i = min(bisect_left(maxes, entry), len(chunks) - 1)
+        chunk = chunks[i]
+        insort(chunk, entry)
+        maxes[i] = chunk[-1]
+        if len(chunk) > self.CHUNK:
+            half = len(chunk) // 2
+            chunks.insert(i + 1, chunk[half:])
+            del chunk[half:]
+            maxes[i] = chunk[-1]
+            maxes.insert(i + 1, chunks[i + 1][-1])
+
+    def remove(self, key):
+        entry = (self._names.pop(key), key)
+        i = bisect_left(self._maxes, entry)
+        chunk = self._chunks[i]
+        del chunk[bisect_left(chunk, entry)]
+        self._starts = None
+        if chunk:
+            self._maxes[i] = chunk[-1]
+        else:
+            del self._chunks[i], self._maxes[i]
+
+    def update(self, key, contact):
+        self.remove(key)
+        self.add(key, contact)
+
+    def clear(self):
+        self._chunks = []
+        self._maxes = []      # last entry of each chunk
+        self._names = {}
+        self._starts = None
+
+    def rank(self, key):
+        # Position of key in name order
+        entry = (self._names[key], key)
+        i = bisect_left(self._maxes, entry)
+        return self._chunk_starts()[i] + bisect_left(self._chunks[i], entry)
+
+    @metrics.timed(items=len)
+    def prefix(self, prefix):
+        # Keys whose name starts with prefix, in name order: one bisect to
+        # find the first match, then a walk over the k matches
+        prefix = fold(prefix)
+        start = (prefix,)
+        keys = []
+        for chunk in islice(self._chunks, bisect_left(self._maxes, start), None):
+            for name, key in islice(chunk, bisect_left(chunk, start), None):
+                if not name.startswith(prefix):
+                    return keys
+                keys.append(key)
+        return keys
+
+    def ordered(self, keys, token=None):
+        # Any collection of indexed keys, sorted the way the index is. Past
+        # about an eighth of the index, walking it and picking out the
+        # keys is cheaper than sorting them, and can be cancelled part way.
+        names = self._names
+        if len(keys) * 8 < len(names):
+            return sorted(keys, key=lambda k: (names.get(k, ""), k))
+        wanted = set(keys)
+        ordered = []
+        for chunk in list(self._chunks):
+            if token is not None:
+                token.check()
+            ordered.extend([key for _, key in list(chunk) if key in wanted])
+        return ordered
+
+class ColumnarContacts:
+    # Append-only contacts stored column by column: each field is one UTF-8
+    # bytearray plus an array of offsets, where row i spans
+    # ends[i]:ends[i + 1]. A row costs its text plus 8 bytes per field,
+    # instead of a Contact and three str objects. With intern_addresses the
+    # addresses are kept as numbers into a table of distinct words, which
+    # saves space when street names and suffixes repeat but makes address
+    # matches a per-row check. Iterating yields Contact records, so
+    # write_csv_batches can save it as it is.
+    def __init__(self, contacts=(), intern_addresses=False):
+        self.intern_addresses = intern_addresses
+        self._data = [bytearray(), bytearray(), bytearray()]
+        self._ends = [array("Q", [0]), array("Q", [0]), array("Q", [0])]
+        self._words = []        # interned address words, by number
+        self._word_ids = {}
+        self._tokens = array("I")
+        self.extend(contacts)
+
+    @classmethod
+    def from_csv(cls, path, intern_addresses=False):
+        return cls(iter_contacts(path, 10_000), intern_addresses)
+
+    @classmethod
+    def from_snapshot(cls, path):
+        # Snapshot blocks hold the same UTF-8 columns, so they are copied
+        # in without creating any per-row objects; only the offsets are
+        # rebuilt from the stored lengths
+        columns = cls()
+        for _, blocks, _ in iter_snapshot_blocks(path):
+            for column, (ends, data) in enumerate(blocks):
+                columns._ends[column].extend(ends)
+                columns._data[column] += data
+        return columns
+
+    def __len__(self):
+        return len(self._ends[0]) - 1
+
+    def append(self, contact):
+        for column, value in enumerate(contact):
+            if column == 1 and self.intern_addresses:
+                self._intern(value)
+                continue
+            data = self._data[column]
+            data += value.encode("utf-8")
+            self._ends[column].append(len(data))
+
+    def _intern(self, address):
+        # Words are split on single spaces, so joining them restores the text
+        word_ids = self._word_ids
+        for word in address.split(" "):
+            number = word_ids.get(word)
+            if number is None:
+                number = word_ids[word] = len(self._words)
+                self._words.append(word)
+            self._tokens.append(number)
+        self._ends[1].append(len(self._tokens))
+
+    def extend(self, contacts):
+        for contact in contacts:
+            self.append(contact)
+
+    def field(self, row, column):
+        ends = self._ends[column]
+        start, end = ends[row], ends[row + 1]
+        if column == 1 and self.intern_addresses:
+            words = self._words
+            return " ".join([words[t] for t in self._tokens[start:end]])
+        return self._data[column][start:end].decode("utf-8")
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError("row out of range")
+        i %= len(self)
+        return Contact(self.field(i, 0), self.field(i, 1), self.field(i, 2))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @metrics.timed(items=len)
+    def search(self, query):
+        # Same matches as search_contacts, as row numbers. A query without
+        # "|" cannot span two fields, so an ASCII one is found in each
+        # column with a case-insensitive regex over its bytes, and only
+        # rows holding non-ASCII text compare their folded field. Interned
+        # addresses compare every row's field, and any other query
+        # compares whole rows.
+        query = normalize_query(query)
+        if not query or not query.isascii() or "|" in query:
+            return [i for i, contact in enumerate(self) if query in contact.search_key]
+        pattern = re.compile(re.escape(query.encode()), re.IGNORECASE)
+        rows = set()
+        for column in range(3):
+            data, ends = self._data[column], self._ends[column]
+            if column == 1 and self.intern_addresses:
+                rows.update(i for i in range(len(self))
+                            if i not in rows and query in fold(self.field(i, column)))
+                continue
+            rows.update(i for i in self._non_ascii_rows(column)
+                        if i not in rows and query in fold(self.field(i, column)))
+            pos = 0
+            while (match := pattern.search(data, pos)) is not None:
+                row = bisect_right(ends, match.start()) - 1
+                if match.end() <= ends[row + 1]:
+                    rows.add(row)
+                    pos = ends[row + 1]
+                else:
+                    # Ran into the next row's text
+                    pos = match.start() + 1
+        return sorted(rows)
+
+    def _non_ascii_rows(self, column):
+        data, ends = self._data[column], self._ends[column]
+        pos = 0
+        while (match := NON_ASCII.search(data, pos)) is not None:
+            row = bisect_right(ends, match.start()) - 1
+            yield row
+            pos = ends[row + 1]
+
+    def nbytes(self):
+        # Memory held by the buffers, offsets and word table
+        size = sum(sys.getsizeof(d) for d in self._data)
+        size += sum(sys.getsizeof(e) for e in self._ends) + sys.getsizeof(self._tokens)
+        if self._words:
+            size += sys.getsizeof(self._words) + sys.getsizeof(self._word_ids)
+            size += sum(sys.getsizeof(w) for w in self._words)
+        return size
+
+def iter_csv_batches(path, batch_size=1000):
+    # Streams a contacts CSV as (contacts, fraction_read) batches. The file
+    # is read in binary so tell() can report progress while csv iterates.
+    size = os.path.getsize(path) or 1
+    with open(path, "rb") as raw:
+        # Short rows get "" for their missing fields rather than None
+        reader = csv.DictReader(codecs.iterdecode(raw, "utf-8"), restval="")
+        batch = []
+        for row in reader:
+            batch.append(Contact(row["Name"], row["Address"], row["Phone"]))
+            if len(batch) >= batch_size:
+                yield batch, raw.tell() / size
+                batch = []
+        yield batch, 1.0
+
+def iter_contacts(path, batch_size=1000):
+    # Any supported format, see batch_reader
+    for batch, _ in batch_reader(path)(path, batch_size):
+        yield from batch
+
+def write_csv_rows(file, contacts):
+    # Streams contacts to an already open text file, e.g. sys.stdout
+    writer = csv.writer(file)
+    writer.writerow(CSV_HEADER)
+    count = 0
+    for count, contact in enumerate(contacts, 1):
+        writer.writerow(contact)
+    return count
+
+def write_csv_batches(path, contacts, batch_size=1000, query=None):
+    # Writes any iterable of contacts to path, yielding the running row
+    # count after each batch. Rows go to a temporary file that only replaces
+    # path once all of them are written, so closing the generator early
+    # leaves path as it was. With a query, only contacts that
+    # search_contacts would match are written.
+    tmp_path = path + ".tmp"
+    rows = iter(contacts) if query is None else iter_search_contacts(contacts, query)
+    written = 0
+    try:
+        with open(tmp_path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(CSV_HEADER)
+            while batch := list(islice(rows, batch_size)):
+                writer.writerows(batch)
+                written += len(batch)
+                yield written
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def is_snapshot(path):
+    with open(path, "rb") as file:
+        return file.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+def write_snapshot_batches(path, contacts, batch_size=10_000, query=None, compress=False):
+    # Binary counterpart of write_csv_batches, with the same temporary file
+    # handling and query filter. The header is written last, once the count
+    # and CRC are known.
+    tmp_path = path + ".tmp"
+    rows = iter(contacts) if query is None else iter_search_contacts(contacts, query)
+    written = crc = 0
+    try:
+        with open(tmp_path, "wb") as file:
+            file.write(bytes(SNAPSHOT_HEADER.size))
+            while batch := list(islice(rows, batch_size)):
+                columns = []
+                for values in zip(*batch):
+                    data = "".join(values).encode("utf-8")
+                    if len(data) == sum(map(len, values)):
+                        lengths = list(map(len, values))  # ASCII: characters are bytes
+                    else:
+                        lengths = [len(v.encode("utf-8")) for v in values]
+                    columns.append((lengths, data))
+                longest = max(max(lengths) for lengths, _ in columns)
+                width = next(n for n in SNAPSHOT_LENGTHS if longest < 1 << 8 * n)
+                parts = []
+                for lengths, data in columns:
+                    lengths = array(SNAPSHOT_LENGTHS[width], lengths)
+                    if sys.byteorder != "little":
+                        lengths.byteswap()
+                    parts += [lengths.tobytes(), data]
+                payload = b"".join(parts)
+                crc = zlib.crc32(payload, crc)
+                if compress:
+                    payload = zlib.compress(payload, 1)
+                file.write(SNAPSHOT_BLOCK.pack(len(batch), len(payload), width))
+                file.write(payload)
+                written += len(batch)
+                yield written
+            file.seek(0)
+            file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                                            SNAPSHOT_ZLIB if compress else 0, written, crc))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def iter_snapshot_blocks(path):
+    # Yields (rows, [(ends, data)] per field, fraction_read) for each block;
+    # ends holds absolute offsets into the field's column, rebuilt from the
+    # stored lengths. Raises ValueError for files that are not snapshots,
+    # other versions, or damaged data.
+    size = os.path.getsize(path) or 1
+    with open(path, "rb") as file:
+        header = file.read(SNAPSHOT_HEADER.size)
+        if len(header) < SNAPSHOT_HEADER.size or not header.startswith(SNAPSHOT_MAGIC):
+            raise ValueError(f"{path} is not a contacts snapshot")
+        _, version, flags, expected_rows, expected_crc = SNAPSHOT_HEADER.unpack(header)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is snapshot version {version}; this build reads "
+                             f"version {SNAPSHOT_VERSION}")
+        rows = crc = 0
+        starts = [0, 0, 0]
+        while block := file.read(SNAPSHOT_BLOCK.size):
+            if len(block) < SNAPSHOT_BLOCK.size:
+                raise ValueError(f"{path} is truncated")
+            count, stored, width = SNAPSHOT_BLOCK.unpack(block)
+            payload = file.read(stored)
+            if len(payload) < stored:
+                raise ValueError(f"{path} is truncated")
+            if width not in SNAPSHOT_LENGTHS:
+                raise ValueError(f"{path} is damaged: bad block header")
+            if flags & SNAPSHOT_ZLIB:
+                try:
+                    payload = zlib.decompress(payload)
+                except zlib.error as e:
+                    raise ValueError(f"{path} is damaged: {e}") from e
+            crc = zlib.crc32(payload, crc)
+            columns = []
+            pos = 0
+            for column in range(3):
+                lengths = array(SNAPSHOT_LENGTHS[width])
+                lengths.frombytes(payload[pos:pos + width * count])
+                if sys.byteorder != "little":
+                    lengths.byteswap()
+                pos += width * count
+                ends = array("Q", accumulate(lengths, initial=starts[column]))[1:]
+                length = ends[-1] - starts[column] if count else 0
+                columns.append((ends, payload[pos:pos + length]))
+                pos += length
+                if count:
+                    starts[column] = ends[-1]
+            rows += count
+            yield count, columns, file.tell() / size
+        if rows != expected_rows or crc != expected_crc:
+            raise ValueError(f"{path} is damaged: checksum or row count does not match")
+
+def iter_snapshot_batches(path, batch_size=1000):
+    # Binary counterpart of iter_csv_batches: (contacts, fraction_read)
+    starts = [0, 0, 0]
+    for count, columns, fraction in iter_snapshot_blocks(path):
+        fields = []
+        for column, (ends, data) in enumerate(columns):
+            base = starts[column]
+            bounds = zip((base, *ends), ends)
+            text = data.decode("utf-8")
+            if len(text) == len(data):
+                # ASCII: byte offsets are character offsets
+                fields.append([text[a - base:b - base] for a, b in bounds])
+            else:
+                fields.append([data[a - base:b - base].decode("utf-8") for a, b in bounds])
+            if count:
+                starts[column] = ends[-1]
+        contacts = list(map(Contact, *fields))
+        for i in range(0, count, batch_size):
+            yield contacts[i:i + batch_size], fraction
+    yield [], 1.0
+
+# JSON Lines: one {"name", "address", "phone"} object per line.
+# vCard 3.0 (RFC 2426): one card per contact with N, FN, ADR and TEL; the
+# whole address goes in the street component of ADR.
+
+def format_json_line(contact):
+    return json.dumps({"name": contact.name, "address": contact.address, "phone": contact.phone},
+                      ensure_ascii=False) + "\n"
+
+def parse_json_line(line):
+    record = json.loads(line)
+    return Contact(record.get("name", ""), record.get("address", ""), record.get("phone", ""))
+
+def vcard_escape(text):
+    return (text.replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;")
+            .replace("\r\n", "\n").replace("\n", "\\n"))
+
+def vcard_components(value):
+    # Splits a structured value on unescaped ";" and unescapes each part
+    parts, current = [], []
+    chars = iter(value)
+    for ch in chars:
+        if ch == "\\":
+            ch = next(chars, "")
+            current.append("\n" if ch in "nN" else ch)
+        elif ch == ";":
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    parts.append("".join(current))
+    return parts
+
+def fold_vcard_line(line):
+    # Lines longer than 75 octets continue on lines starting with a space
+    if len(line.encode("utf-8")) <= 75:
+        return line + "\r\n"
+    pieces, piece, size = [], [], 0
+    for ch in line:
+        width = len(ch.encode("utf-8"))
+        if size + width > (75 if not pieces else 74):
+            pieces.append("".join(piece))
+            piece, size = [], 0
+        piece.append(ch)
+        size += width
+    pieces.append("".join(piece))
+    return "\r\n ".join(pieces) + "\r\n"
+
+def format_vcard(contact):
+    given, _, family = contact.name.rpartition(" ")
+    lines = ["BEGIN:VCARD", "VERSION:3.0",
+             f"N:{vcard_escape(family)};{vcard_escape(given)};;;",
+             f"FN:{vcard_escape(contact.name)}"]
+    if contact.address:
+        lines.append(f"ADR;TYPE=HOME:;;{vcard_escape(contact.address)};;;;")
+    if contact.phone:
+        lines.append(f"TEL;TYPE=VOICE:{vcard_escape(contact.phone)}")
+    lines.append("END:VCARD")
+    return "".join(fold_vcard_line(line) for line in lines)
+
+def write_text_rows(file, contacts, format_row):
+    count = 0
+    for count, contact in enumerate(contacts, 1):
+        file.write(format_row(contact))
+    return count
+
+def write_text_batches(path, contacts, format_row, batch_size=1000, query=None):
+    # Same contract as write_csv_batches for one-string-per-contact formats;
+    # at most one batch of text is held at a time
+    tmp_path = path + ".tmp"
+    rows = iter(contacts) if query is None else iter_search_contacts(contacts, query)
+    written = 0
+    try:
+        with open(tmp_path, "w", newline="", encoding="utf-8") as file:
+            while batch := list(islice(rows, batch_size)):
+                file.write("".join(map(format_row, batch)))
+                written += len(batch)
+                yield written
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def write_jsonl_batches(path, contacts, batch_size=1000, query=None):
+    return write_text_batches(path, contacts, format_json_line, batch_size, query)
+
+def write_vcard_batches(path, contacts, batch_size=1000, query=None):
+    return write_text_batches(path, contacts, format_vcard, batch_size, query)
+
+def iter_jsonl_batches(path, batch_size=1000):
+    # Same contract as iter_csv_batches; blank lines are skipped
+    size = os.path.getsize(path) or 1
+    with open(path, "rb") as raw:
+        batch = []
+        for line in raw:
+            if line.strip():
+                batch.append(parse_json_line(line))
+                if len(batch) >= batch_size:
+                    yield batch, raw.tell() / size
+                    batch = []
+        yield batch, 1.0
+
+def unfold_vcard_lines(raw):
+    # Joins folded continuation lines back onto the line they belong to
+    pending = None
+    for line in raw:
+        line = line.decode("utf-8").rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending
+        pending = line
+    if pending is not None:
+        yield pending
+
+def vcard_text(value):
+    # Unescapes a plain text value, keeping any bare ";"
+    return ";".join(vcard_components(value))
+
+def vcard_contact(card):
+    # card maps FN, N, ADR and TEL to the first raw value seen for each
+    if "FN" in card:
+        name = vcard_text(card["FN"])
+    else:
+        family, given = (vcard_components(card.get("N", "")) + [""])[:2]
+        name = f"{given} {family}".strip()
+    address = ", ".join(part for part in vcard_components(card.get("ADR", "")) if part)
+    return Contact(name, address, vcard_text(card.get("TEL", "")))
+
+def iter_vcard_batches(path, batch_size=1000):
+    # Same contract as iter_csv_batches. Takes FN (or N) as the name, the
+    # first ADR with its non-empty parts joined by ", ", and the first TEL;
+    # other properties are ignored.
+    size = os.path.getsize(path) or 1
+    with open(path, "rb") as raw:
+        batch = []
+        card = None
+        for line in unfold_vcard_lines(raw):
+            prop, _, value = line.partition(":")
+            name = prop.split(";")[0].split(".")[-1].upper()
+            if name == "BEGIN" and value.upper() == "VCARD":
+                card = {}
+            elif card is None:
+                continue
+            elif name == "END":
+                batch.append(vcard_contact(card))
+                card = None
+                if len(batch) >= batch_size:
+                    yield batch, raw.tell() / size
+                    batch = []
+            elif name in ("FN", "N", "ADR", "TEL"):
+                card.setdefault(name, value)
+        yield batch, 1.0
+
+def batch_writer(path):
+    # The write_*_batches function for path's extension; CSV by default
+    extension = os.path.splitext(path)[1].lower()
+    return {".jsonl": write_jsonl_batches, ".vcf": write_vcard_batches,
+            SNAPSHOT_EXT: write_snapshot_batches}.get(extension, write_csv_batches)
+
+def batch_reader(path):
+    # The iter_*_batches function for path: snapshots are recognised by
+    # their header, the rest by extension, CSV by default
+    if is_snapshot(path):
+        return iter_snapshot_batches
+    extension = os.path.splitext(path)[1].lower()
+    return {".jsonl": iter_jsonl_batches, ".vcf": iter_vcard_batches}.get(extension,
+                                                                          iter_csv_batches)
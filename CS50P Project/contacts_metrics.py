@@ -0,0 +1,141 @@
+# contacts_metrics.py
+# Opt-in latency histograms for address-book operations. Code is wrapped
+# with metrics.timed(...) or `with metrics.measure(...)`; while metrics is
+# disabled (the default) both cost one attribute check per call. Results
+# can be dumped to JSON for offline analysis.
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds of the histogram buckets in milliseconds; slower calls go
+# in a final overflow bucket
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.items = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, seconds, items=None):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.buckets[bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+        if items is not None:
+            self.items += items
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding that share of calls, in ms
+        seen = 0
+        for bound, n in zip(BUCKETS_MS + (self.max * 1000,), self.buckets):
+            seen += n
+            if seen >= fraction * self.count:
+                return min(bound, self.max * 1000)
+        return self.max * 1000
+
+    def to_dict(self):
+        return {"count": self.count, "items": self.items, "total_ms": self.total * 1000,
+                "mean_ms": self.total * 1000 / self.count if self.count else 0.0,
+                "min_ms": (self.min or 0.0) * 1000, "max_ms": self.max * 1000,
+                "p50_ms": self.percentile(0.5), "p95_ms": self.percentile(0.95),
+                "buckets": dict(zip([f"<={b}ms" for b in BUCKETS_MS] + ["more"], self.buckets))}
+
+class Measurement:
+    # What `with metrics.measure(...) as m` gives; set m.items to the
+    # number of items handled
+    __slots__ = ("metrics", "name", "items", "start")
+
+    def __init__(self, metrics, name, items):
+        self.metrics = metrics
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, time.perf_counter() - self.start, self.items)
+
+class NullMeasurement:
+    # Shared stand-in while disabled; setting items is allowed and ignored
+    items = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def __setattr__(self, name, value):
+        pass
+
+NULL_MEASUREMENT = NullMeasurement()
+
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.last = None        # (name, seconds, items) of the latest record
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, items=None):
+        # Safe to call from worker threads
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds, items)
+            self.last = (name, seconds, items)
+
+    def measure(self, name, items=None):
+        return Measurement(self, name, items) if self.enabled else NULL_MEASUREMENT
+
+    def timed(self, name=None, items=None):
+        # Decorator; items(result) gives the item count, e.g. items=len
+        def decorate(func):
+            label = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+                self.record(label, time.perf_counter() - start,
+                            items(result) if items is not None else None)
+                return result
+            return wrapper
+        return decorate
+
+    def describe_last(self):
+        if self.last is None:
+            return ""
+        name, seconds, items = self.last
+        counted = f", {items:,} items" if items is not None else ""
+        return f"{name} {seconds * 1000:.1f} ms{counted}"
+
+    def to_dict(self):
+        with self._lock:
+            return {name: h.to_dict() for name, h in sorted(self.histograms.items())}
+
+    def dump(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.last = None
+
+# The instance the address book modules record into
+metrics = Metrics()
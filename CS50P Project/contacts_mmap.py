@@ -0,0 +1,103 @@
+# contacts_mmap.py
+# Read-only access to very large contacts CSV files. The file is memory
+# mapped and indexed once by row offset; rows are only decoded into
+# Contact records when they are displayed, selected or matched.
+import csv
+import mmap
+import re
+from array import array
+from bisect import bisect_right
+from contacts_logic import CSV_HEADER, NON_ASCII, Contact, checked, normalize_query
+
+class MappedContacts:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            # mmap refuses empty files
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if file.read(1) else b""
+        self.offsets = array("Q")
+        header_end = self.index_rows()
+        header = next(csv.reader([self.map[:header_end].decode("utf-8-sig")]), None) or CSV_HEADER
+        self.columns = [header.index(field) for field in CSV_HEADER]
+        # Rows with non-ASCII bytes. Folding can turn them into an ASCII
+        # match ("José" for "jose") that a bytes regex would miss, so
+        # searches check these rows one by one.
+        self.non_ascii = array("Q")
+        pos, end = self.offsets[0], self.offsets[-1]
+        while (match := NON_ASCII.search(self.map, pos, end)) is not None:
+            row = self.row_at(match.start())
+            self.non_ascii.append(row)
+            pos = self.offsets[row + 1]
+
+    def index_rows(self):
+        # Single pass over the mapping recording where each row starts; the
+        # last offset is the end of the data. Newlines inside quoted fields
+        # do not end a row. Returns where the header row ends.
+        data, offsets = self.map, self.offsets
+        size = len(data)
+        has_quotes = data.find(b'"') != -1
+        pos = 0
+        header_end = None
+        while pos < size:
+            end = data.find(b"\n", pos)
+            if has_quotes:
+                while end != -1 and data[pos:end].count(b'"') % 2:
+                    end = data.find(b"\n", end + 1)
+            end = size if end == -1 else end + 1
+            if header_end is None:
+                header_end = end
+            elif end - pos > 2 or data[pos:end].strip():
+                offsets.append(pos)
+            pos = end
+        offsets.append(size)
+        return header_end or 0
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError("row out of range")
+        i %= len(self)
+        line = self.map[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+        fields = next(csv.reader([line]))
+        return Contact(*(fields[c] if c < len(fields) else "" for c in self.columns))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def row_at(self, offset):
+        return bisect_right(self.offsets, offset) - 1
+
+    def search(self, query, token=None):
+        # Same matches as search_contacts, as row numbers (a range for an
+        # empty query); a token lets a worker thread cancel it part way. ASCII queries are found by a case-insensitive regex
+        # over the mapped bytes and only the rows it hits are decoded, plus
+        # the non-ASCII rows, which are always decoded and folded. Anything
+        # the raw CSV text could misrepresent (separators, quotes,
+        # non-ASCII) falls back to decoding every row.
+        query = normalize_query(query)
+        if not query:
+            # Everything matches; nothing needs decoding
+            return range(len(self))
+        if not query.isascii() or any(ch in query for ch in '|,"\r\n'):
+            return [row for rows in checked(range(len(self)), token)
+                    for row in rows if query in self[row].search_key]
+        pattern = re.compile(re.escape(query.encode()), re.IGNORECASE)
+        folded = set(self.non_ascii)
+        results = [row for rows in checked(self.non_ascii, token)
+                   for row in rows if query in self[row].search_key]
+        pos = self.offsets[0]
+        end = self.offsets[-1]
+        while (match := pattern.search(self.map, pos, end)) is not None:
+            if token is not None:
+                token.check()
+            row = self.row_at(match.start())
+            if row not in folded and query in self[row].search_key:
+                results.append(row)
+            pos = self.offsets[row + 1]
+        return sorted(results)
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
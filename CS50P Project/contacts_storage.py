@@ -0,0 +1,397 @@
+# contacts_storage.py
+# Storage backends for the address book; the GUI works through either one.
+# MemoryBackend keeps the book in a dict with in-memory indexes and is
+# loaded from and saved to files; SQLiteBackend keeps it in a database
+# (--db) and commits each edit. Both offer add/add_many/update/delete,
+# book[key], items, clear, CSV import/export, search (matches in ID order),
+# find (the keys a list view shows for a query), duplicates and `order`,
+# the keys by name, which can back a list view directly.
+import sqlite3
+import threading
+from contacts_logic import (Contact, FieldIndex, FuzzyIndex, IncrementalSearch, NameIndex,
+                            PhoneIndex, QueryCache, TrigramIndex, fold, is_field_query,
+                            iter_csv_batches, normalize_phone, normalize_query, parse_query,
+                            write_csv_batches)
+
+class MemoryBackend:
+    # Contacts by ID in a dict. IDs are handed out in order and never reused,
+    # so a key names the same record for as long as it exists. Every index is
+    # updated on each edit; searches can run on a worker thread meanwhile.
+    def __init__(self):
+        self.contacts = {}
+        self.next_id = 0
+        self.first_id = 0       # first ID since the book was last cleared
+        self.record_index = TrigramIndex()
+        self.phone_index = PhoneIndex()
+        self.fuzzy_index = FuzzyIndex()
+        self.order = NameIndex()
+        self.field_index = FieldIndex(self.record_index)   # name:, addr: and phone: queries
+        self.indexes = (self.record_index, self.phone_index, self.fuzzy_index,
+                        self.order, self.field_index)
+        self.live_search = IncrementalSearch(self.record_index)
+        self.query_cache = QueryCache(self.live_search.search)
+
+    def __len__(self):
+        return len(self.contacts)
+
+    def __getitem__(self, key):
+        return self.contacts[key]
+
+    def __contains__(self, key):
+        return key in self.contacts
+
+    def get(self, key):
+        return self.contacts[key]
+
+    def add(self, contact):
+        return self.add_many([contact])[0]
+
+    def add_many(self, contacts):
+        # Returns the new IDs, in order
+        contacts = list(contacts)
+        keys = range(self.next_id, self.next_id + len(contacts))
+        self.next_id = keys.stop
+        self.contacts.update(zip(keys, contacts))
+        for key, contact in zip(keys, contacts):
+            for index in self.indexes:
+                index.add(key, contact)
+        if len(contacts) == 1:
+            self.query_cache.changed(keys[0], None, contacts[0])
+        else:
+            # Cheaper to start over than to patch every cached query per row
+            self.query_cache.invalidate()
+        self.live_search.reset()
+        return keys
+
+    def update(self, key, contact):
+        old, self.contacts[key] = self.contacts[key], contact
+        for index in self.indexes:
+            index.update(key, contact)
+        self.query_cache.changed(key, old, contact)
+        self.live_search.reset()
+
+    def delete(self, key):
+        old = self.contacts.pop(key)
+        for index in self.indexes:
+            index.remove(key)
+        self.query_cache.changed(key, old, None)
+        self.live_search.reset()
+
+    def clear(self):
+        self.contacts.clear()
+        self.first_id = self.next_id
+        for index in self.indexes:
+            index.clear()
+        self.query_cache.invalidate()
+        self.live_search.reset()
+
+    def search(self, query):
+        contacts = self.contacts
+        return [(key, contacts[key]) for key in self.query_cache.search(query)]
+
+    def find(self, query, fuzzy=False, distance=2, token=None):
+        # Keys to show for a search box query: all of them by name when it is
+        # empty, closest names first for a fuzzy search, otherwise by name.
+        # A token lets a search on a worker thread be cancelled part way.
+        if not query.strip():
+            return self.order
+        if is_field_query(query):
+            # e.g. name:ka phone:512 OR addr:"oak"; not cached, as the
+            # cache patches entries by plain substring
+            return self.order.ordered(self.field_index.search(query, token), token)
+        if fuzzy:
+            return self.fuzzy_index.search(query, distance, token)
+        return self.order.ordered(self.query_cache.search(query, token), token)
+
+    def duplicates(self, contact, key=None):
+        return self.phone_index.duplicates(contact, key)
+
+    def items(self):
+        return iter(self.contacts.items())
+
+    def snapshot(self):
+        # The contacts as they are now, for a save or compaction that runs
+        # while the book keeps changing
+        return list(self.contacts.values())
+
+    def import_csv(self, path, batch_size=10_000):
+        count = 0
+        for batch, _ in iter_csv_batches(path, batch_size):
+            count += len(self.add_many(batch))
+        return count
+
+    def export_csv(self, path):
+        for _ in write_csv_batches(path, self.snapshot()):
+            pass
+
+    def close(self):
+        pass
+
+# Stored per row besides the fields: the search key and the folded forms
+# that name:, addr: and phone: queries and duplicate checks compare
+COLUMNS = ("name", "address", "phone", "search_key", "name_key", "address_key", "phone_digits")
+
+# SQLite virtual machine steps between checks for a cancelled search
+PROGRESS_STEPS = 10_000
+
+# Column compared by each parse_query field other than phone
+FIELD_COLUMNS = {None: "search_key", "name": "name_key", "address": "address_key"}
+
+def row_values(contact):
+    return (*contact, contact.search_key, fold(contact.name), fold(contact.address),
+            normalize_phone(contact.phone))
+
+class SQLiteBackend:
+    # Contacts in an SQLite table, one commit per edit. Each row also keeps
+    # its search key and folded fields, computed in Python on insert and
+    # update; an external-content FTS5 trigram table over the search key
+    # answers substring searches that ignore case and accents, and triggers
+    # keep it in step with the table. Only the folded names and IDs are held
+    # in memory, in `order`; the typo-tolerant name index is built on the
+    # first fuzzy search. Searches may run on other threads, which read
+    # through connections of their own.
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS contacts (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            address TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            search_key TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            address_key TEXT NOT NULL,
+            phone_digits TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS contacts_name ON contacts(name_key, id);
+        CREATE INDEX IF NOT EXISTS contacts_phone ON contacts(phone_digits);
+        CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+            search_key, content='contacts', content_rowid='id', tokenize='trigram'
+        );
+        CREATE TRIGGER IF NOT EXISTS contacts_ai AFTER INSERT ON contacts BEGIN
+            INSERT INTO contacts_fts(rowid, search_key) VALUES (new.id, new.search_key);
+        END;
+        CREATE TRIGGER IF NOT EXISTS contacts_ad AFTER DELETE ON contacts BEGIN
+            INSERT INTO contacts_fts(contacts_fts, rowid, search_key)
+            VALUES ('delete', old.id, old.search_key);
+        END;
+        CREATE TRIGGER IF NOT EXISTS contacts_au AFTER UPDATE ON contacts BEGIN
+            INSERT INTO contacts_fts(contacts_fts, rowid, search_key)
+            VALUES ('delete', old.id, old.search_key);
+            INSERT INTO contacts_fts(rowid, search_key) VALUES (new.id, new.search_key);
+        END;
+    """
+    INSERT = (f"INSERT INTO contacts (id, {', '.join(COLUMNS)}) "
+              f"VALUES (?, {', '.join('?' * len(COLUMNS))})")
+    # Searches never use the in-memory cache; the FTS index answers them
+    query_cache = None
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(contacts)")]
+        if columns and columns != ["id", *COLUMNS]:
+            self.upgrade()
+        self.conn.executescript(self.SCHEMA)
+        self.owner = threading.get_ident()
+        self.local = threading.local()
+        # Held while writing, and while the fuzzy index is built from a read
+        self.lock = threading.Lock()
+        self.fuzzy_index = None
+        self.order = NameIndex()
+        for key, name in self.conn.execute("SELECT id, name_key FROM contacts ORDER BY name_key, id"):
+            self.order.add_name(key, name)
+
+    def upgrade(self):
+        # Databases from before the folded columns were stored; rebuilt with
+        # the same IDs
+        rows = self.conn.execute("SELECT id, name, address, phone FROM contacts").fetchall()
+        self.conn.executescript(
+            "BEGIN; DROP TABLE IF EXISTS contacts_fts; DROP VIEW IF EXISTS contacts_text; "
+            "DROP TABLE contacts;" + self.SCHEMA + "COMMIT;")
+        with self.conn:
+            self.conn.executemany(self.INSERT, ((contact_id, *row_values(Contact(*fields)))
+                                                for contact_id, *fields in rows))
+
+    def connection(self):
+        # sqlite3 connections belong to the thread that opened them
+        if threading.get_ident() == self.owner:
+            return self.conn
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path)
+        return conn
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, contact_id):
+        return self.get(contact_id)
+
+    def __contains__(self, contact_id):
+        return self.connection().execute(
+            "SELECT 1 FROM contacts WHERE id = ?", (contact_id,)).fetchone() is not None
+
+    def add(self, contact):
+        return self.add_many([contact])[0]
+
+    def add_many(self, contacts):
+        # One transaction and one executemany for the whole batch, with
+        # ids assigned explicitly so they can be returned
+        contacts = list(contacts)
+        with self.lock, self.conn:
+            start = self.conn.execute("SELECT coalesce(max(id), 0) + 1 FROM contacts").fetchone()[0]
+            self.conn.executemany(self.INSERT, ((start + i, *row_values(c))
+                                                for i, c in enumerate(contacts)))
+            keys = range(start, start + len(contacts))
+            for key, contact in zip(keys, contacts):
+                self.order.add(key, contact)
+                if self.fuzzy_index is not None:
+                    self.fuzzy_index.add(key, contact)
+        return keys
+
+    def update(self, contact_id, contact):
+        assignments = ", ".join(f"{column} = ?" for column in COLUMNS)
+        with self.lock, self.conn:
+            self.conn.execute(f"UPDATE contacts SET {assignments} WHERE id = ?",
+                              (*row_values(contact), contact_id))
+            self.order.update(contact_id, contact)
+            if self.fuzzy_index is not None:
+                self.fuzzy_index.update(contact_id, contact)
+
+    def delete(self, contact_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM contacts WHERE id = ?", (contact_id,))
+            self.order.remove(contact_id)
+            if self.fuzzy_index is not None:
+                self.fuzzy_index.remove(contact_id)
+
+    def get(self, contact_id):
+        row = self.connection().execute("SELECT name, address, phone FROM contacts WHERE id = ?",
+                                        (contact_id,)).fetchone()
+        if row is None:
+            raise KeyError(contact_id)
+        return Contact(*row)
+
+    def matches(self, query, columns):
+        # Rows whose search key contains the folded query, in ID order
+        query = normalize_query(query)
+        if len(query) < 3:
+            # The trigram tokenizer cannot match shorter strings
+            return self.connection().execute(
+                f"SELECT {columns} FROM contacts c WHERE instr(c.search_key, ?) > 0 ORDER BY c.id",
+                (query,))
+        phrase = '"' + query.replace('"', '""') + '"'
+        return self.connection().execute(
+            f"SELECT {columns} FROM contacts_fts f JOIN contacts c ON c.id = f.rowid "
+            "WHERE contacts_fts MATCH ? ORDER BY c.id", (phrase,))
+
+    def search(self, query):
+        # Same matching as search_contacts
+        rows = self.matches(query, "c.id, c.name, c.address, c.phone")
+        return [(contact_id, Contact(*fields)) for contact_id, *fields in rows]
+
+    def field_search(self, query):
+        # IDs matching a parse_query query, compared the way FieldIndex does
+        groups, params = [], []
+        for group in parse_query(query):
+            conditions, values = [], []
+            for field, value in group:
+                if field == "phone":
+                    digits = normalize_phone(value)
+                    if value.strip() and not digits:
+                        break   # phone:abc matches no phone, so not the group either
+                    column, value = "phone_digits", digits
+                else:
+                    column, value = FIELD_COLUMNS[field], normalize_query(value)
+                conditions.append(f"instr({column}, ?) > 0")
+                values.append(value)
+            else:
+                groups.append(" AND ".join(conditions))
+                params.extend(values)
+        if not groups:
+            return []
+        where = " OR ".join(f"({group})" for group in groups)
+        return [key for key, in self.connection().execute(
+            f"SELECT id FROM contacts WHERE {where} ORDER BY id", params)]
+
+    def find(self, query, fuzzy=False, distance=2, token=None):
+        # Same views as MemoryBackend.find. A cancelled token interrupts the
+        # statement running on this thread's connection.
+        if not query.strip():
+            return self.order
+        conn = self.connection()
+        if token is not None:
+            conn.set_progress_handler(lambda: token.cancelled, PROGRESS_STEPS)
+        try:
+            if is_field_query(query):
+                return self.order.ordered(self.field_search(query), token)
+            if fuzzy:
+                return self.fuzzy().search(query, distance, token)
+            return self.order.ordered([key for key, in self.matches(query, "c.id")], token)
+        except sqlite3.OperationalError:
+            if token is not None:
+                token.check()   # interrupted: report the cancellation instead
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def fuzzy(self):
+        with self.lock:
+            if self.fuzzy_index is None:
+                rows = self.connection().execute("SELECT id, name, address, phone FROM contacts")
+                index = FuzzyIndex()
+                for contact_id, *fields in rows:
+                    index.add(contact_id, Contact(*fields))
+                self.fuzzy_index = index
+            return self.fuzzy_index
+
+    def duplicates(self, contact, key=None):
+        # IDs of other contacts with the same phone digits
+        digits = normalize_phone(contact.phone)
+        if not digits:
+            return []
+        return [found for found, in self.connection().execute(
+            "SELECT id FROM contacts WHERE phone_digits = ? AND id IS NOT ? ORDER BY id",
+            (digits, key))]
+
+    def items(self):
+        for batch in self.item_batches():
+            yield from batch
+
+    def item_batches(self, batch_size=1000):
+        # Lists of (id, contact) in id order. Closing the generator part way
+        # closes its cursor; an open read would make clear() fail with
+        # "database table is locked".
+        cursor = self.connection().execute("SELECT id, name, address, phone FROM contacts ORDER BY id")
+        try:
+            while rows := cursor.fetchmany(batch_size):
+                yield [(contact_id, Contact(*fields)) for contact_id, *fields in rows]
+        finally:
+            cursor.close()
+
+    def snapshot(self):
+        # Read lazily by whichever thread iterates it, as one statement, so
+        # edits committed meanwhile are not part of it
+        return (contact for batch in self.item_batches() for _, contact in batch)
+
+    def clear(self):
+        # Dropping the tables is far faster than firing the delete trigger per row
+        with self.lock:
+            self.conn.executescript(
+                "BEGIN; DROP TABLE contacts_fts; DROP TABLE contacts;" + self.SCHEMA + "COMMIT;")
+            self.order.clear()
+            self.fuzzy_index = None
+
+    def import_csv(self, path, batch_size=10_000):
+        count = 0
+        for batch, _ in iter_csv_batches(path, batch_size):
+            count += len(self.add_many(batch))
+        return count
+
+    def export_csv(self, path):
+        for _ in write_csv_batches(path, self.snapshot()):
+            pass
+
+    def close(self):
+        self.conn.close()
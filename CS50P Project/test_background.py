@@ -0,0 +1,103 @@
+# test_background.py
+import threading
+import time
+import pytest
+from background import BackgroundExecutor, Cancelled
+
+def poll_until(executor, done, timeout=5):
+    deadline = time.perf_counter() + timeout
+    while not done() and time.perf_counter() < deadline:
+        executor.poll()
+        time.sleep(0.001)
+
+def test_progress_and_result_delivered_by_poll():
+    executor = BackgroundExecutor()
+    seen, results = [], []
+
+    def work(token, emit):
+        for i in range(3):
+            emit(i)
+        return "done"
+
+    executor.submit("io", work, results.append, seen.append)
+    poll_until(executor, lambda: results)
+    assert seen == [0, 1, 2]
+    assert results == ["done"]
+    assert not executor.busy("io")
+
+def test_superseded_request_is_ignored():
+    executor = BackgroundExecutor()
+    release = threading.Event()
+    results = []
+
+    def slow(token, emit):
+        release.wait()
+        return "old"
+
+    executor.submit("search", slow, results.append)
+    executor.submit("search", lambda token, emit: "new", results.append)
+    release.set()
+    poll_until(executor, lambda: results)
+    time.sleep(0.05)
+    executor.poll()
+    assert results == ["new"]
+
+def test_cancel_stops_emit():
+    executor = BackgroundExecutor(max_queued=1)
+    started, stopped, cancelled = threading.Event(), threading.Event(), []
+
+    def work(token, emit):
+        started.set()
+        try:
+            while True:
+                emit(None)
+        except Cancelled:
+            stopped.set()
+            raise
+
+    executor.submit("io", work, pytest.fail, on_cancel=lambda: cancelled.append(True))
+    started.wait(5)
+    assert executor.cancel("io")
+    assert stopped.wait(5)
+    assert cancelled == [True]
+    assert not executor.cancel("io")
+
+def test_error_goes_to_on_error():
+    executor = BackgroundExecutor()
+    errors = []
+
+    def work(token, emit):
+        raise ValueError("bad file")
+
+    executor.submit("io", work, pytest.fail, on_error=errors.append)
+    poll_until(executor, lambda: errors)
+    assert str(errors[0]) == "bad file"
+
+def test_callback_error_drops_request():
+    executor = BackgroundExecutor(max_queued=1)
+    errors, stopped = [], threading.Event()
+
+    def work(token, emit):
+        try:
+            while True:
+                emit(None)
+        except Cancelled:
+            stopped.set()
+            raise
+
+    def on_progress(item):
+        raise KeyError("row")
+
+    executor.submit("io", work, pytest.fail, on_progress, errors.append)
+    poll_until(executor, lambda: errors)
+    assert isinstance(errors[0], KeyError)
+    assert not executor.busy("io")
+    assert stopped.wait(5)
+
+    def on_done(result):
+        raise ValueError(result)
+
+    executor.submit("search", lambda token, emit: "late", on_done)
+    with pytest.raises(ValueError):
+        poll_until(executor, lambda: False)
+    assert not executor.busy("search")
@@ -0,0 +1,33 @@
+# test_bench_contacts.py
+import json
+from bench_contacts import compare, compare_columnar, compare_snapshot, generate_contacts, run_suite
+
+def test_generator_is_reproducible():
+    first = list(generate_contacts(50, seed=7))
+    assert first == list(generate_contacts(50, seed=7))
+    assert first != list(generate_contacts(50, seed=8))
+    assert all(c.name and c.phone.count("-") == 2 for c in first)
+
+def test_run_suite_reports_every_operation():
+    report = run_suite([20], memory=False)
+    json.dumps(report)
+    assert set(report["results"]) == {"format_contact", "parse_contact", "search_contacts",
+                                      "csv_save", "csv_load"}
+    assert report["results"]["csv_load"]["20"]["seconds"] >= 0
+
+def test_compare_flags_regressions():
+    baseline = {"results": {"csv_load": {"1000": {"seconds": 1.0, "peak_bytes": 100}}}}
+    current = {"results": {"csv_load": {"1000": {"seconds": 1.1, "peak_bytes": 300}},
+                           "csv_save": {"1000": {"seconds": 9.0, "peak_bytes": None}}}}
+    regressions = compare(current, baseline, tolerance=0.25)
+    assert len(regressions) == 1 and regressions[0].startswith("csv_load @ 1000: peak_bytes")
+
+def test_compare_columnar_reports_each_layout():
+    results = compare_columnar(200)
+    assert set(results) == {"list", "columnar", "interned"}
+    assert results["columnar"]["bytes_per_contact"] < results["list"]["bytes_per_contact"]
+
+def test_compare_snapshot_reports_each_format():
+    results = compare_snapshot(100)
+    assert set(results) == {"csv", "snapshot", "snapshot_zlib"}
+    assert results["snapshot_zlib"]["bytes"] < results["snapshot"]["bytes"]
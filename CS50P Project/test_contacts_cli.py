@@ -0,0 +1,61 @@
+# test_contacts_cli.py
+import subprocess
+import sys
+import pytest
+from contacts_cli import main
+
+@pytest.fixture
+def book(tmp_path):
+    path = tmp_path / "book.csv"
+    path.write_text("Name,Address,Phone\n"
+                    "Alice,Wonderland,111\n"
+                    " Bob ,Builder Blvd,222\n"
+                    "Nobody,Nowhere,\n"
+                    "Bobby,Harbour,(222)\n")
+    return str(path)
+
+def test_search_and_count(book, capsys):
+    main(["search", book, "bob"])
+    assert capsys.readouterr().out.splitlines() == [" Bob  | Builder Blvd | 222", "Bobby | Harbour | (222)"]
+    main(["count", book, "-q", "harbour"])
+    assert capsys.readouterr().out == "1\n"
+
+def test_import_rejects_invalid_rows(book, tmp_path, capsys):
+    out = str(tmp_path / "clean.csv")
+    main(["import", book, "-o", out])
+    assert "3 imported, 1 rejected" in capsys.readouterr().err
+    main(["export", out, "-q", "bob"])
+    assert capsys.readouterr().out.splitlines()[1] == "Bob,Builder Blvd,222"
+
+def test_parallel_import_matches_serial(book, tmp_path, capsys):
+    for name in ["serial.jsonl", "parallel.jsonl", "parallel.csv"]:
+        workers = [] if name.startswith("serial") else ["--workers", "2"]
+        main(["import", book, "-o", str(tmp_path / name)] + workers)
+        assert "3 imported, 1 rejected" in capsys.readouterr().err
+    assert (tmp_path / "parallel.jsonl").read_text() == (tmp_path / "serial.jsonl").read_text()
+    assert "Bob,Builder Blvd,222" in (tmp_path / "parallel.csv").read_text()
+
+def test_dedupe(book, tmp_path, capsys):
+    out = tmp_path / "unique.csv"
+    main(["dedupe", book, "-o", str(out)])
+    assert "3 kept, 1 duplicates removed" in capsys.readouterr().err
+    assert "Bobby" not in out.read_text()
+
+def test_cli_does_not_import_tkinter():
+    code = "import sys, contacts_cli; sys.exit('tkinter' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+def test_gui_module_imports_without_a_window():
+    tkinter = pytest.importorskip("tkinter")
+    import contacts
+    assert contacts.root is None
+    assert tkinter._default_root is None
+
+def test_export_formats(book, tmp_path, capsys):
+    main(["export", book, "-q", "alice", "-f", "jsonl"])
+    assert capsys.readouterr().out == '{"name": "Alice", "address": "Wonderland", "phone": "111"}\n'
+    cards = tmp_path / "book.vcf"
+    main(["export", book, "-o", str(cards)])
+    assert cards.read_text().count("BEGIN:VCARD") == 4
+    main(["count", str(cards), "-q", "bob"])
+    assert capsys.readouterr().out == "2\n"
@@ -0,0 +1,53 @@
+# test_contacts_import.py
+from contacts_logic import Contact, iter_contacts
+from contacts_import import import_csv, split_ranges
+
+def write_dump(path, rows):
+    path.write_text("Name,Address,Phone\n" + "".join(rows), encoding="utf-8")
+    return str(path)
+
+def test_import_validates_and_keeps_order(tmp_path):
+    path = write_dump(tmp_path / "dump.csv", [
+        " Alice , Wonderland, 111\n",
+        ",No Name,222\n",
+        "Bob,\"Builder\nBlvd\",333\n",
+        "\n",
+        "Carol,Crestview,\n",
+        "Dave,Dockside,444\n",
+    ])
+    out = str(tmp_path / "clean.csv")
+    result = import_csv(path, out, workers=2, chunk_bytes=16)
+    assert list(iter_contacts(out)) == [
+        Contact("Alice", "Wonderland", "111"),
+        Contact("Bob", "Builder\nBlvd", "333"),
+        Contact("Dave", "Dockside", "444"),
+    ]
+    assert result.accepted == 3
+    assert [(row, reason) for row, _, reason in result.rejected] == [
+        (2, "Name and phone are required."),
+        (4, "Name and phone are required."),
+    ]
+    assert result.rows == 5
+
+def test_split_ranges_cover_file_on_row_boundaries(tmp_path):
+    rows = [f"Person {i},{i} Main St,555-{i:04d}\n" for i in range(200)]
+    path = write_dump(tmp_path / "dump.csv", rows)
+    data_start = len("Name,Address,Phone\n")
+    ranges = split_ranges(path, data_start, chunk_bytes=500)
+    assert len(ranges) > 1
+    assert ranges[0][0] == data_start
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    data = (tmp_path / "dump.csv").read_bytes()
+    assert ranges[-1][1] == len(data)
+    assert all(data[b - 1:b] == b"\n" for _, b in ranges)
+
+def test_split_ranges_skip_newlines_in_quotes(tmp_path):
+    rows = [f'Person {i},"{i} Main St\nFlat ""{i}""",555-{i:04d}\n' for i in range(200)]
+    path = write_dump(tmp_path / "dump.csv", rows)
+    data = (tmp_path / "dump.csv").read_bytes()
+    row_starts = {len("Name,Address,Phone\n")}
+    for row in rows:
+        row_starts.add(max(row_starts) + len(row.encode()))
+    ranges = split_ranges(path, min(row_starts), chunk_bytes=100)
+    assert len(ranges) > 1
+    assert all(b in row_starts for _, b in ranges) and ranges[-1][1] == len(data)
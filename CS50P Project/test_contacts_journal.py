@@ -0,0 +1,91 @@
+# test_contacts_journal.py
+import os
+import contacts_journal
+from contacts_logic import Contact
+from contacts_journal import Journal
+
+def test_replay_after_snapshot(tmp_path):
+    path = str(tmp_path / "contacts.csv")
+    journal = Journal(path)
+    journal.record_adds(0, [Contact("Alice", "Wonderland", "111"),
+                            Contact("Bob", "Builder Blvd", "222")])
+    journal.record_update(0, Contact("Alicia", "Wonderland", "111"))
+    journal.close()
+    assert Journal(path).load() == [Contact("Alicia", "Wonderland", "111"),
+                                     Contact("Bob", "Builder Blvd", "222")]
+
+def test_clear_and_partial_record(tmp_path):
+    path = str(tmp_path / "contacts.csv")
+    journal = Journal(path)
+    journal.record_add(0, Contact("Alice", "Wonderland", "111"))
+    journal.record_clear()
+    journal.record_add(0, Contact("Bob", "Line\nBreak", "222"))
+    journal.close()
+    with open(path + ".journal", "a") as log:
+        log.write('["A",1,"Car')
+    journal = Journal(path)
+    assert journal.load() == [Contact("Bob", "Line\nBreak", "222")]
+    journal.record_add(1, Contact("Carol", "Crestview", "333"))
+    assert len(journal.load()) == 2
+
+def test_compaction_writes_snapshot_and_keeps_later_edits(tmp_path):
+    path = str(tmp_path / "contacts.csv")
+    journal = Journal(path, min_bytes=10)
+    contacts = [Contact("Alice", "Wonderland", "111"), Contact("Bob", "Builder Blvd", "222")]
+    for i, contact in enumerate(contacts):
+        journal.record_add(i, contact)
+    assert journal.needs_compaction()
+    steps = journal.compact_steps(list(contacts), batch_size=1)
+    # An edit made before the first slice, and one while the snapshot is
+    # being written
+    contacts.append(Contact("Carol", "Crestview", "333"))
+    journal.record_add(2, contacts[2])
+    next(steps)
+    contacts[0] = Contact("Alicia", "Wonderland", "111")
+    journal.record_update(0, contacts[0])
+    for _ in steps:
+        pass
+    assert not os.path.exists(path + ".journal.old")
+    assert Journal(path).load() == contacts
+
+def test_replay_is_idempotent_after_interrupted_compaction(tmp_path, monkeypatch):
+    path = str(tmp_path / "contacts.csv")
+    journal = Journal(path)
+    journal.record_add(0, Contact("Alice", "Wonderland", "111"))
+    journal.record_update(0, Contact("Alicia", "Wonderland", "111"))
+    steps = journal.compact_steps([Contact("Alicia", "Wonderland", "111")])
+    for _ in steps:
+        pass
+    # Simulate dying after the snapshot was replaced but before the old
+    # journal was removed
+    with open(path + ".journal.old", "w") as old:
+        old.write('["A",0,"Alice","Wonderland","111"]\n["U",0,"Alicia","Wonderland","111"]\n')
+    assert Journal(path).load() == [Contact("Alicia", "Wonderland", "111")]
+
+    # Replaying a journal that clears the book onto the snapshot written
+    # from it would fail, so the old journal must be recognised as folded in
+    six = [Contact(f"Row {i}", "", str(i)) for i in range(6)]
+    Journal(path).compact(six)
+    journal = Journal(path)
+    journal.record_update(5, Contact("Fifth", "", "5"))
+    journal.record_clear()
+    journal.record_add(0, Contact("Dave", "Dover", "444"))
+    remove = os.remove
+
+    def die_on_old(name):
+        if name.endswith(".old"):
+            raise KeyboardInterrupt
+        remove(name)
+
+    monkeypatch.setattr(contacts_journal.os, "remove", die_on_old)
+    try:
+        journal.compact([Contact("Dave", "Dover", "444")])
+    except KeyboardInterrupt:
+        pass
+    monkeypatch.undo()
+    assert os.path.exists(path + ".journal.old")
+    journal = Journal(path)
+    assert journal.load() == [Contact("Dave", "Dover", "444")]
+    journal.compact(journal.load())
+    assert not os.path.exists(path + ".journal.old")
+    assert Journal(path).load() == [Contact("Dave", "Dover", "444")]
@@ -1,6 +1,14 @@
 # test_contacts_logic.py
 import pytest
-from contacts_logic import format_contact, parse_contact, search_contacts
+from contacts_logic import (Contact, TrigramIndex, IncrementalSearch, make_contact, format_contact,
+                            parse_contact, search_contacts, iter_csv_batches, write_csv_batches,
+                            normalize_phone, PhoneIndex, DuplicateContactError, dedupe,
+                            edit_distance, BKTree, FuzzyIndex, AhoCorasick, search_many, NameIndex,
+                            ColumnarContacts, write_snapshot_batches, iter_snapshot_batches,
+                            is_snapshot, QueryCache, write_jsonl_batches, write_vcard_batches,
+                            iter_jsonl_batches, iter_vcard_batches, iter_contacts, fold,
+                            parse_query, is_field_query, FieldIndex, diff_contacts,
+                            file_signature, batch_writer)
 
 def test_format_contact_valid():
     result = format_contact("Alice", "123 Main St", "555-1234")
@@ -35,3 +43,359 @@ def test_search_contacts_case_insensitive():
 def test_search_contacts_no_match():
     contacts = ["Alice | Wonderland | 111"]
     assert search_contacts(contacts, "xyz") == []
+
+def test_make_contact_valid():
+    contact = make_contact("Alice", "123 Main St", "555-1234")
+    assert (contact.name, contact.address, contact.phone) == ("Alice", "123 Main St", "555-1234")
+    assert str(contact) == "Alice | 123 Main St | 555-1234"
+
+def test_make_contact_missing_phone():
+    with pytest.raises(ValueError):
+        make_contact("Alice", "123 Main St", "")
+
+def test_contact_from_string():
+    contact = Contact.from_string("Alice | 123 Main St | 555-1234")
+    assert contact == Contact("Alice", "123 Main St", "555-1234")
+    assert list(contact) == ["Alice", "123 Main St", "555-1234"]
+
+def test_contact_has_no_instance_dict():
+    assert not hasattr(Contact("Alice", "", "1"), "__dict__")
+
+def test_search_contacts_records():
+    contacts = [Contact("Alice", "Wonderland", "111"), Contact("Bob", "Builder Blvd", "222")]
+    assert search_contacts(contacts, "builder") == [Contact("Bob", "Builder Blvd", "222")]
+
+def test_trigram_index_matches_search_contacts(sample_contacts):
+    contacts = sample_contacts
+    index = TrigramIndex(contacts)
+    for query in ["bob", "ALICE", "er", "l", "view | 3", "xyz", ""]:
+        expected = search_contacts(contacts, query)
+        assert [contacts[k] for k in index.search(query)] == expected
+
+def test_trigram_index_incremental(sample_contacts):
+    index = TrigramIndex(sample_contacts)
+    index.add(3, Contact("Dave", "Dockside", "444"))
+    assert index.search("dock") == [3]
+    index.update(1, Contact("Bobby", "Harbour", "222"))
+    assert index.search("builder") == []
+    assert index.search("harb") == [1]
+    index.remove(0)
+    assert index.search("alice") == []
+    index.clear()
+    assert len(index) == 0 and index.search("") == []
+
+def test_incremental_search_narrows_previous_results(sample_contacts):
+    index = TrigramIndex(sample_contacts)
+    live = IncrementalSearch(index)
+    assert live.search("l") == [0, 1, 2]
+    index.add(3, Contact("Dave", "Lakeside", "444"))
+    # Without a reset the narrowed search only sees the earlier results
+    assert live.search("la") == [0]
+    live.reset()
+    assert live.search("la") == [0, 3]
+    assert live.search("lak") == [3]
+    assert live.search("bob") == [1]
+
+def test_csv_batches_round_trip(tmp_path, sample_contacts):
+    path = str(tmp_path / "contacts.csv")
+    contacts = sample_contacts + [Contact("José, Jr.", "1 \"Quoted\" Way", "555")]
+    assert list(write_csv_batches(path, contacts, batch_size=3)) == [3, 4]
+    batches = list(iter_csv_batches(path, batch_size=3))
+    assert [len(b) for b, _ in batches] == [3, 1]
+    assert batches[-1][1] == 1.0
+    assert [c for b, _ in batches for c in b] == contacts
+
+def test_csv_short_rows_get_empty_fields(tmp_path):
+    path = tmp_path / "contacts.csv"
+    path.write_text("Name,Address,Phone\nBob,Addr\nAnn\n")
+    contacts = list(iter_contacts(str(path)))
+    assert contacts == [Contact("Bob", "Addr", ""), Contact("Ann", "", "")]
+    assert search_contacts(contacts, "bob") == contacts[:1]
+    assert dedupe(contacts) == contacts
+
+def test_write_csv_batches_cancelled_keeps_old_file(tmp_path, sample_contacts):
+    path = tmp_path / "contacts.csv"
+    path.write_text("Name,Address,Phone\n")
+    steps = write_csv_batches(str(path), sample_contacts, batch_size=1)
+    next(steps)
+    steps.close()
+    assert path.read_text() == "Name,Address,Phone\n"
+    assert not (tmp_path / "contacts.csv.tmp").exists()
+
+def test_normalize_phone():
+    assert normalize_phone("(512) 555-0294") == "5125550294"
+    assert normalize_phone("512.555.0294") == "5125550294"
+    assert normalize_phone("ext") == ""
+
+def test_phone_index_detects_duplicates(sample_contacts):
+    index = PhoneIndex(sample_contacts)
+    assert index.find("1-1-1") == [0]
+    assert index.duplicates(Contact("Al", "", "(111)")) == [0]
+    assert index.duplicates(Contact("Alice", "", "111"), key=0) == []
+    with pytest.raises(DuplicateContactError):
+        index.check(Contact("Robert", "", "222"))
+    index.update(1, Contact("Bob", "", "999"))
+    index.check(Contact("Robert", "", "222"))
+    index.remove(0)
+    assert index.find("111") == []
+
+def test_dedupe_keeps_first_per_phone(sample_contacts):
+    contacts = sample_contacts + [Contact("Bobby", "", "2-2-2"), Contact("X", "", ""), Contact("Y", "", "")]
+    assert dedupe(contacts) == sample_contacts + [Contact("X", "", ""), Contact("Y", "", "")]
+
+def test_edit_distance():
+    assert edit_distance("rodriguez", "rodriquez") == 1
+    assert edit_distance("kitten", "sitting") == 3
+    assert edit_distance("kitten", "sitting", limit=1) == 2
+    assert edit_distance("", "abc") == 3
+
+def test_bk_tree_search():
+    tree = BKTree(["rodriguez", "rodgers", "ramirez", "lin", "lina"])
+    assert sorted(tree.search("rodriquez", 1)) == [(1, "rodriguez")]
+    assert sorted(tree.search("lin", 1)) == [(0, "lin"), (1, "lina")]
+
+def test_fuzzy_index_finds_misspelled_names():
+    contacts = [Contact("Elena Rodriguez", "", "1"), Contact("Jacob Lin", "", "2"),
+                Contact("Elena Rodgers", "", "3")]
+    index = FuzzyIndex(contacts)
+    assert index.search("Rodriquez", 1) == [0]
+    assert index.search("elena rodriquez") == [0]
+    assert index.search("elana") == [0, 2]
+    assert index.search("jakob", 1) == [1]
+    index.update(0, Contact("Elena Ramirez", "", "1"))
+    assert index.search("rodriquez", 1) == []
+    assert index.search("ramires", 1) == [0]
+    index.clear()
+    assert index.search("elena") == []
+
+def test_aho_corasick_finds_overlapping_patterns():
+    automaton = AhoCorasick(["he", "she", "his", "hers", "x"])
+    assert automaton.find("ushers") == {0, 1, 3}
+    assert automaton.find("hi") == set()
+
+def test_search_many_matches_search_contacts(sample_contacts):
+    contacts = sample_contacts
+    queries = ["bob", "ALICE", "er", "l", "view | 3", "xyz", "", "bob "]
+    expected = [search_contacts(contacts, q) for q in queries]
+    assert search_many(iter(contacts), queries) == expected
+
+def test_name_index_keeps_name_order():
+    names = ["kate", "Bob", "Karl", "alice", "Kai", "Zoe", "ka"]
+    index = NameIndex(Contact(name, "", str(i)) for i, name in enumerate(names))
+    index.CHUNK = 2  # force several chunks
+    index.add(7, Contact("Kaa", "", "7"))
+    assert [names[k] if k < 7 else "Kaa" for k in index] == \
+        ["alice", "Bob", "ka", "Kaa", "Kai", "Karl", "kate", "Zoe"]
+    assert index.prefix("KA") == [6, 7, 4, 2, 0]
+    assert index.prefix("kat") == [0]
+    assert index.prefix("x") == []
+    index.update(1, Contact("Kaz", "", "1"))
+    index.remove(7)
+    assert index.prefix("ka") == [6, 4, 2, 0, 1]
+    assert [index[i] for i in range(len(index))] == list(index)
+    assert index.rank(1) == 5
+    assert index.ordered([5, 3, 1]) == [3, 1, 5]
+    index.clear()
+    assert len(index) == 0 and index.prefix("") == []
+
+@pytest.mark.parametrize("intern", [False, True])
+def test_columnar_contacts_round_trip_and_search(tmp_path, intern, sample_contacts):
+    contacts = sample_contacts + [Contact("José Ünal", "12 Oak  St", ""), Contact("ab", "c", "9")]
+    columns = ColumnarContacts(contacts, intern_addresses=intern)
+    assert len(columns) == 5
+    assert list(columns) == contacts
+    assert columns[-1] == Contact("ab", "c", "9")
+    with pytest.raises(IndexError):
+        columns[5]
+    for query in ["bob", "ALICE", "er", "view | 3", "josé", "JOSE", "unal", "oak  st", "bc", "b | c",
+                  "xyz", ""]:
+        expected = [i for i, c in enumerate(contacts) if search_contacts([c], query)]
+        assert columns.search(query) == expected, query
+    path = str(tmp_path / "contacts.csv")
+    for _ in write_csv_batches(path, columns):
+        pass
+    assert list(ColumnarContacts.from_csv(path, intern)) == contacts
+    assert columns.nbytes() > 0
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_snapshot_round_trip(tmp_path, compress, sample_contacts):
+    # The long fields need 2- and 4-byte lengths in their blocks
+    contacts = sample_contacts * 3 + [Contact("José Ünal", "Line\nBreak", ""), Contact("", "", "")]
+    contacts += [Contact("a" * 300, "b" * 70_000, "1"), Contact("c" * 300, "", "")]
+    path = str(tmp_path / "contacts.cbk")
+    written = list(write_snapshot_batches(path, contacts, batch_size=4, compress=compress))
+    assert written == [4, 8, 12, 13]
+    assert is_snapshot(path)
+    batches = list(iter_snapshot_batches(path, batch_size=3))
+    assert [c for batch, _ in batches for c in batch] == contacts
+    fractions = [fraction for _, fraction in batches]
+    assert fractions == sorted(fractions) and 0 < fractions[0] and fractions[-1] == 1.0
+    assert list(ColumnarContacts.from_snapshot(path)) == contacts
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_snapshot_rejects_damage(tmp_path, compress, sample_contacts):
+    path = str(tmp_path / "contacts.cbk")
+    for _ in write_snapshot_batches(path, sample_contacts, compress=compress):
+        pass
+    with open(path, "r+b") as file:
+        file.seek(-1, 2)
+        file.write(b"X")
+    with pytest.raises(ValueError, match="damaged"):
+        list(iter_snapshot_batches(path))
+    csv_path = str(tmp_path / "contacts.csv")
+    for _ in write_csv_batches(csv_path, sample_contacts):
+        pass
+    assert not is_snapshot(csv_path)
+    with pytest.raises(ValueError, match="not a contacts snapshot"):
+        list(iter_snapshot_batches(csv_path))
+
+def test_query_cache_hits_and_evicts(sample_contacts):
+    calls = []
+    index = TrigramIndex(sample_contacts)
+
+    def search(query, token=None):
+        calls.append(query)
+        return index.search(query)
+
+    cache = QueryCache(search, max_entries=2)
+    assert cache.search(" Bob ") == [1]
+    assert cache.search("bob") == [1]
+    cache.search("er")
+    cache.search("l")  # evicts "bob", the least recently used
+    cache.search("bob")
+    assert calls == ["bob", "er", "l", "bob"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 4 and len(cache) == 2
+
+def test_query_cache_caps_cached_keys(sample_contacts):
+    index = TrigramIndex(sample_contacts)
+    cache = QueryCache(index.search, max_keys=2)
+    assert cache.search("l") == [0, 1, 2]  # larger than the budget: not kept
+    assert len(cache) == 0
+    cache.search("bob")
+    cache.search("ol")
+    assert cache.stats()["keys"] == 2
+    cache.search("alice")  # evicts "bob" to stay within 2 keys
+    assert len(cache) == 2 and cache.stats()["keys"] == 2
+    cache.changed(3, None, Contact("Olive", "", "4"))  # "ol" grows to [2, 3]
+    assert cache.stats()["keys"] <= 2
+    assert cache.search("alice") == [0] and cache.stats()["hits"] == 1
+
+def test_query_cache_patches_changed_contacts(sample_contacts):
+    contacts = sample_contacts
+    index = TrigramIndex(contacts)
+    cache = QueryCache(index.search)
+    assert cache.search("ol") == [2]
+    assert cache.search("bob") == [1]
+    before = cache.search("ol")
+    cache.changed(1, contacts[1], Contact("Bolton", "Builder Blvd", "222"))
+    assert cache.search("ol") == [1, 2]
+    assert before == [2]  # lists already handed out are left alone
+    assert cache.search("bob") == []
+    cache.changed(3, None, Contact("Olive", "", "4"))
+    assert cache.search("ol") == [1, 2, 3]
+    assert cache.stats()["patched"] == 3
+    cache.invalidate()
+    assert len(cache) == 0
+
+def test_query_cache_drops_results_computed_before_a_change():
+    cache = None
+
+    def search(query, token=None):
+        cache.changed(0, None, Contact("Alice", "", "1"))  # lands mid-search
+        return []
+
+    cache = QueryCache(search)
+    cache.search("al")
+    assert len(cache) == 0
+
+@pytest.mark.parametrize("write, read", [(write_jsonl_batches, iter_jsonl_batches),
+                                         (write_vcard_batches, iter_vcard_batches)])
+def test_jsonl_and_vcard_round_trip(tmp_path, write, read, sample_contacts):
+    contacts = sample_contacts + [Contact("Zoë Ünal", "12 Oak St, Apt 3; rear\nBack \\ door", ""),
+                                    Contact("X" * 120, "é" * 60, "1")]
+    path = str(tmp_path / "contacts.out")
+    assert list(write(path, contacts, batch_size=2)) == [2, 4, 5]
+    assert [c for batch, _ in read(path, 2) for c in batch] == contacts
+    assert list(write(path, contacts, query="BOB")) == [1]
+    assert [c for batch, _ in read(path) for c in batch] == [contacts[1]]
+
+@pytest.mark.parametrize("name", ["book.csv", "book.jsonl", "book.vcf", "book.cbk"])
+def test_every_batch_writer_filters_by_query(tmp_path, name, sample_contacts):
+    path = str(tmp_path / name)
+    assert list(batch_writer(path)(path, sample_contacts, query="BOB")) == [1]
+    assert list(iter_contacts(path)) == [sample_contacts[1]]
+
+def test_vcard_lines_are_folded_and_foreign_cards_read(tmp_path):
+    path = tmp_path / "contacts.vcf"
+    for _ in write_vcard_batches(str(path), [Contact("é" * 60, "", "1")]):
+        pass
+    assert all(len(line) <= 75 for line in path.read_bytes().split(b"\r\n"))
+    path.write_text("BEGIN:VCARD\nVERSION:3.0\nN:Doe;John;;;\n"
+                    "item1.ADR;TYPE=WORK:;;1 Main St;Austin;TX;78701;\n"
+                    "TEL;TYPE=CELL:512-555-\n 0101\nTEL:999\nEND:VCARD\n")
+    assert list(iter_contacts(str(path))) == [Contact("John Doe", "1 Main St, Austin, TX, 78701",
+                                                      "512-555-0101")]
+
+def test_search_keys_fold_case_and_accents():
+    assert fold("JOSÉ Müller ﬁ") == "jose muller fi"
+    contacts = [Contact("José Álvarez", "Straße 5", "1"), Contact("Jose Alvarez", "Oak", "2"),
+                Contact("Zoë", "Zürich", "3")]
+    key = contacts[0].search_key
+    assert key == "jose alvarez | strasse 5 | 1" and contacts[0].search_key is key
+    assert search_contacts(contacts, "JOSE") == contacts[:2]
+    assert search_contacts(contacts, "josé álv") == contacts[:2]
+    assert search_contacts(contacts, "strasse") == [contacts[0]]
+    assert TrigramIndex(contacts).search("zuri") == [2]
+    assert ColumnarContacts(contacts).search("zoe") == [2]
+    assert ColumnarContacts(contacts, intern_addresses=True).search("ZURICH") == [2]
+    assert FuzzyIndex(contacts).search("alvares", 1) == [0, 1]
+    assert NameIndex(contacts).prefix("JOSE") == [0, 1]
+
+def test_parse_query():
+    assert parse_query('name:ka Phone:512 OR addr:"oak ""st""" pine  hollow') == [
+        [("name", "ka"), ("phone", "512")], [("address", 'oak "st"'), (None, "pine hollow")]]
+    assert parse_query("open 12:30 AND") == [[(None, "open 12:30")]]
+    assert not is_field_query("pine  hollow") and not is_field_query("12:30")
+    assert is_field_query("name:ka") and is_field_query("a OR b") and is_field_query('"a b"')
+
+def test_field_index_scopes_clauses_to_fields():
+    contacts = [Contact("Kara", "555 Oak St", "512-111-2222"),
+                Contact("Sam 555", "1 Pine Rd", "555-0100"),
+                Contact("Kate", "9 Oak Ave", "(415) 555-0199")]
+    record_index = TrigramIndex(contacts)
+    index = FieldIndex(record_index, contacts)
+    assert record_index.search("555") == [0, 1, 2]
+    assert index.search("phone:555") == [1, 2]
+    assert index.search("name:555") == [1]
+    assert index.search('addr:"oak" phone:(512)') == [0]
+    assert index.search("name:ka OR phone:5550100") == [0, 1, 2]
+    assert index.search("name:kat oak") == [2]
+    assert index.search("phone:abc") == index.search("phone:-") == []
+    assert index.search("name:zz OR phone:abc") == []
+    assert index.search('name:ka phone:""') == [0, 2]
+    index.update(2, Contact("Kate", "9 Elm Ave", "415-555-0199"))
+    record_index.update(2, Contact("Kate", "9 Elm Ave", "415-555-0199"))
+    assert index.search("addr:oak") == [0]
+    index.remove(0)
+    assert index.search("name:ka") == [2]
+
+def test_diff_contacts():
+    old = {10: Contact("Ann", "1 Oak", "555-0001"), 11: Contact("Bob", "2 Elm", "555-0002"),
+           12: Contact("Cy", "3 Ash", "555-0003"), 13: Contact("Di", "4 Fir", "555-0004")}
+    new = [Contact("Di", "4 Fir", "555-0004"), Contact("Ann", "1 Oak", "555-0001"),
+           Contact("Robert", "2 Elm", "(555) 000-2"), Contact("cy", "3 Ash", "555-9999"),
+           Contact("Eve", "5 Yew", "555-0005")]
+    inserts, updates, deletes = diff_contacts(old, new)
+    assert inserts == [Contact("Eve", "5 Yew", "555-0005")]
+    assert updates == [(11, new[2]), (12, new[3])]
+    assert deletes == []
+    assert diff_contacts(old, new[:2]) == ([], [], [11, 12])
+    assert diff_contacts({}, []) == ([], [], [])
+
+def test_file_signature(tmp_path):
+    path = tmp_path / "contacts.csv"
+    assert file_signature(str(path)) is None
+    path.write_text("Name,Address,Phone\n")
+    before = file_signature(str(path))
+    path.write_text("Name,Address,Phone\nAnn,1 Oak,555\n")
+    assert file_signature(str(path)) != before
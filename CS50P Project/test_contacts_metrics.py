@@ -0,0 +1,37 @@
+# test_contacts_metrics.py
+import json
+from contacts_metrics import Metrics, NULL_MEASUREMENT
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics()
+    double = metrics.timed("double")(lambda x: 2 * x)
+    assert double(4) == 8
+    with metrics.measure("block") as m:
+        m.items = 3
+    assert metrics.measure("block") is NULL_MEASUREMENT
+    assert metrics.to_dict() == {} and metrics.describe_last() == ""
+
+def test_timed_and_measure_build_histograms(tmp_path):
+    metrics = Metrics(enabled=True)
+
+    @metrics.timed(items=len)
+    def find(query):
+        return [query] * 3
+
+    find("a")
+    find("b")
+    with metrics.measure("render") as m:
+        m.items = 10
+    metrics.record("load", 0.2, 1000)
+    report = metrics.to_dict()
+    name = find.__qualname__
+    assert report[name]["count"] == 2 and report[name]["items"] == 6
+    assert report["render"]["items"] == 10
+    assert report["load"]["buckets"]["<=250ms"] == 1
+    assert report["load"]["p50_ms"] == 200
+    assert metrics.describe_last() == "load 200.0 ms, 1,000 items"
+    path = tmp_path / "metrics.json"
+    metrics.dump(str(path))
+    assert json.loads(path.read_text()) == report
+    metrics.reset()
+    assert metrics.to_dict() == {}
@@ -0,0 +1,41 @@
+# test_contacts_mmap.py
+import pytest
+from contacts_logic import Contact, search_contacts, write_csv_batches
+from contacts_mmap import MappedContacts
+
+@pytest.fixture
+def contacts(sample_contacts):
+    # Plus rows the raw CSV text holds differently: quoted commas and
+    # newlines, and non-ASCII
+    return sample_contacts + [Contact("Dave", "Builder Blvd, Apt 2", "444"),
+                              Contact("Erin", "Crest\nview", "555"),
+                              Contact("José", "Plaza Mayor", "666")]
+
+def write_sample(tmp_path, contacts):
+    path = str(tmp_path / "contacts.csv")
+    for _ in write_csv_batches(path, contacts):
+        pass
+    return path
+
+def test_rows_decode_lazily(tmp_path, contacts):
+    mapped = MappedContacts(write_sample(tmp_path, contacts))
+    assert len(mapped) == 6
+    assert mapped[4] == Contact("Erin", "Crest\nview", "555")
+    assert mapped[-1] == Contact("José", "Plaza Mayor", "666")
+    assert list(mapped) == contacts
+    mapped.close()
+
+def test_search_matches_search_contacts(tmp_path, contacts):
+    mapped = MappedContacts(write_sample(tmp_path, contacts))
+    for query in ["bob", "ALICE", "er", "blvd, apt", "crest\nview", "josé", "JOSE", "name", "a | w", ""]:
+        assert [contacts[i] for i in mapped.search(query)] == search_contacts(contacts, query)
+    assert mapped.search("  ") == range(6)
+    mapped.close()
+
+def test_column_order_and_empty_file(tmp_path):
+    path = tmp_path / "reordered.csv"
+    path.write_text("Phone,Name,Address\n111,Alice,Wonderland\n\n")
+    assert list(MappedContacts(str(path))) == [Contact("Alice", "Wonderland", "111")]
+    empty = tmp_path / "empty.csv"
+    empty.write_text("")
+    assert len(MappedContacts(str(empty))) == 0
@@ -0,0 +1,130 @@
+# test_contacts_storage.py
+import sqlite3
+import threading
+import pytest
+from background import CancelToken, Cancelled
+from contacts_logic import Contact, search_contacts
+from contacts_storage import MemoryBackend, SQLiteBackend
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryBackend()
+    else:
+        store = SQLiteBackend(str(tmp_path / "contacts.db"))
+    yield store
+    store.close()
+
+def test_add_get_update_delete(backend, sample_contacts):
+    alice, bob, _ = backend.add_many(sample_contacts)
+    assert backend.get(bob) == Contact("Bob", "Builder Blvd", "222")
+    backend.update(bob, Contact("Bobby", "Harbour", "222"))
+    assert backend.search("builder") == []
+    assert backend.search("harb") == [(bob, Contact("Bobby", "Harbour", "222"))]
+    backend.delete(alice)
+    assert len(backend) == 2
+    dave = backend.add(Contact("Dave", "Dockside", "444"))
+    assert dave not in (alice, bob)
+
+def test_search_matches_search_contacts(backend, sample_contacts):
+    contacts = sample_contacts
+    backend.add_many(contacts)
+    for query in ["bob", "ALICE", "er", "l", "view | 3", "xyz", ""]:
+        assert [c for _, c in backend.search(query)] == search_contacts(contacts, query)
+
+def test_search_ignores_case_and_accents(backend):
+    jose = backend.add(Contact("José Núñez", "Straße 5", "1"))
+    backend.add(Contact("Joseph", "Main", "2"))
+    assert [i for i, _ in backend.search("JOSE NU")] == [jose]
+    assert [i for i, _ in backend.search("nunez")] == [jose]
+    assert [i for i, _ in backend.search("strasse")] == [jose]
+    backend.update(jose, Contact("Jose Nunez", "Hauptstraße 5", "1"))
+    assert [i for i, _ in backend.search("hauptstrasse")] == [jose]
+
+def test_find_orders_by_name(backend):
+    carol, alice, bob = backend.add_many([Contact("Carol", "Oak", "333"),
+                                          Contact("alice", "Oak", "111"),
+                                          Contact("Bob", "Elm", "5-1-1")])
+    assert list(backend.find("")) == [alice, bob, carol]
+    assert backend.find("oak") == [alice, carol]
+    assert backend.find("name:bo OR phone:111") == [alice, bob]
+    assert backend.find("phone:abc") == []
+    assert backend.find("alcie", fuzzy=True) == [alice]
+    backend.update(alice, Contact("Zoe", "Oak", "111"))
+    assert backend.order.rank(alice) == 2
+    assert backend.find("zoe", fuzzy=True, distance=1) == [alice]
+    assert backend.duplicates(Contact("X", "", "(111)")) == [alice]
+    assert backend.duplicates(Contact("Zoe", "Oak", "111"), alice) == []
+
+def test_find_from_another_thread(backend, sample_contacts):
+    backend.add_many(sample_contacts)
+    found = []
+    thread = threading.Thread(target=lambda: found.extend(backend.find("builder")))
+    thread.start()
+    thread.join()
+    assert [backend[key] for key in found] == [sample_contacts[1]]
+
+def test_upgrade_adds_search_keys(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE contacts (id INTEGER PRIMARY KEY, name TEXT NOT NULL,
+                               address TEXT NOT NULL, phone TEXT NOT NULL);
+        CREATE VIEW contacts_text AS
+            SELECT id, name || ' | ' || address || ' | ' || phone AS text FROM contacts;
+        CREATE VIRTUAL TABLE contacts_fts USING fts5(
+            text, content='contacts_text', content_rowid='id', tokenize='trigram');
+        INSERT INTO contacts VALUES (7, 'José', 'Straße 5', '1');
+    """)
+    conn.close()
+    store = SQLiteBackend(path)
+    assert store.search("strasse") == [(7, Contact("José", "Straße 5", "1"))]
+    store.close()
+
+def test_cancelled_find_raises(backend):
+    backend.add_many([Contact(f"Name {i}", f"{i} Oak Street", str(i)) for i in range(5000)])
+    token = CancelToken()
+    token.cancel()
+    for query in ["oak", "e", "name:na phone:1", "nmae"]:
+        with pytest.raises(Cancelled):
+            backend.find(query, fuzzy=query == "nmae", token=token)
+    assert len(backend.find("oak", token=CancelToken())) == 5000
+    if isinstance(backend, MemoryBackend):
+        assert len(backend.query_cache) == 1   # only the search that finished
+
+def test_clear(backend, sample_contacts):
+    backend.add_many(sample_contacts)
+    backend.clear()
+    assert len(backend) == 0
+    assert backend.search("alice") == []
+    backend.add(Contact("Alice", "", "1"))
+    assert [c.name for _, c in backend.search("alice")] == ["Alice"]
+
+def test_clear_after_a_cancelled_read(tmp_path, sample_contacts):
+    store = SQLiteBackend(str(tmp_path / "contacts.db"))
+    store.add_many(sample_contacts)
+    batches = store.item_batches(2)
+    assert [c for _, c in next(batches)] == sample_contacts[:2]
+    batches.close()
+    store.clear()
+    assert len(store) == 0
+    store.close()
+
+def test_csv_round_trip(backend, tmp_path, sample_contacts):
+    backend.add_many(sample_contacts)
+    path = str(tmp_path / "out.csv")
+    backend.export_csv(path)
+    other = MemoryBackend() if isinstance(backend, SQLiteBackend) else SQLiteBackend(
+        str(tmp_path / "other.db"))
+    assert other.import_csv(path) == 3
+    assert [c for _, c in other.items()] == sample_contacts
+    other.close()
+
+def test_sqlite_persists_each_edit(tmp_path):
+    path = str(tmp_path / "contacts.db")
+    store = SQLiteBackend(path)
+    store.add(Contact("Alice", "Wonderland", "111"))
+    reopened = SQLiteBackend(path)
+    assert [c for _, c in reopened.items()] == [Contact("Alice", "Wonderland", "111")]
+    store.close()
+    reopened.close()
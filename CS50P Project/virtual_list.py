@@ -0,0 +1,127 @@
+# virtual_list.py
+import tkinter as tk
+
+class VirtualList(tk.Frame):
+    # A Listbox that only holds the rows in view plus a small overscan.
+    # The items stay in a Python sequence owned by the caller; render()
+    # turns one item into the text shown for it. After changing the
+    # sequence in place, call refresh().
+    def __init__(self, master, items=(), render=str, width=70, height=10, overscan=5):
+        super().__init__(master)
+        self.items = items
+        self.render = render
+        self.height = height
+        self.overscan = overscan
+        self.top = 0          # item shown in the first visible row
+        self.start = 0        # item in the first materialized row
+        self.count = 0        # number of materialized rows
+        self.selected = None  # selected position in items
+
+        self.listbox = tk.Listbox(self, width=width, height=height, exportselection=False)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.listbox.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.listbox.bind("<<ListboxSelect>>", self.on_listbox_select)
+        self.listbox.bind("<MouseWheel>", self.on_wheel)
+        self.listbox.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll_by(3))
+        self.listbox.bind("<Up>", lambda e: self.move_selection(-1))
+        self.listbox.bind("<Down>", lambda e: self.move_selection(1))
+        self.listbox.bind("<Prior>", lambda e: self.scroll_by(-self.height))
+        self.listbox.bind("<Next>", lambda e: self.scroll_by(self.height))
+        # The Listbox would otherwise autoscan its few rows while dragging
+        self.listbox.bind("<B1-Leave>", lambda e: "break")
+        self.refresh()
+
+    def set_items(self, items):
+        self.items = items
+        self.top = 0
+        self.selected = None
+        self.refresh()
+
+    def refresh(self):
+        if self.selected is not None and self.selected >= len(self.items):
+            self.selected = None
+        self.top = max(0, min(self.top, self.max_top()))
+        self.materialize()
+
+    def selected_item(self):
+        return None if self.selected is None else self.items[self.selected]
+
+    def max_top(self):
+        return max(0, len(self.items) - self.height)
+
+    def materialize(self):
+        self.start = max(0, self.top - self.overscan)
+        end = min(len(self.items), self.top + self.height + self.overscan)
+        self.listbox.delete(0, tk.END)
+        if end > self.start:
+            self.listbox.insert(tk.END, *(self.render(self.items[i]) for i in range(self.start, end)))
+        self.count = end - self.start
+        self.place_view()
+
+    def place_view(self):
+        self.listbox.yview(self.top - self.start)
+        self.listbox.selection_clear(0, tk.END)
+        if self.selected is not None and self.start <= self.selected < self.start + self.count:
+            self.listbox.selection_set(self.selected - self.start)
+        total = len(self.items)
+        if total <= self.height:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.top / total, (self.top + self.height) / total)
+
+    def scroll_to(self, top):
+        self.top = max(0, min(top, self.max_top()))
+        end = min(len(self.items), self.top + self.height)
+        if self.start <= self.top and end <= self.start + self.count:
+            # Still inside the overscan: just move the Listbox view
+            self.place_view()
+        else:
+            self.materialize()
+        return "break"
+
+    def scroll_by(self, rows):
+        return self.scroll_to(self.top + rows)
+
+    def see(self, position):
+        if position < self.top:
+            self.scroll_to(position)
+        elif position >= self.top + self.height:
+            self.scroll_to(position - self.height + 1)
+        else:
+            self.place_view()
+
+    def select(self, position):
+        # None clears the selection
+        self.selected = position
+        self.refresh()
+        if position is not None:
+            self.see(position)
+
+    def move_selection(self, delta):
+        if not self.items:
+            return "break"
+        current = self.top - 1 if self.selected is None else self.selected
+        self.selected = max(0, min(current + delta, len(self.items) - 1))
+        self.see(self.selected)
+        self.event_generate("<<ListboxSelect>>")
+        return "break"
+
+    def on_listbox_select(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self.selected = self.start + selection[0]
+            self.event_generate("<<ListboxSelect>>")
+
+    def on_scrollbar(self, action, *args):
+        # Scrollbar fractions map to item offsets, not Listbox rows
+        if action == "moveto":
+            self.scroll_to(int(float(args[0]) * len(self.items)))
+        elif action == "scroll":
+            step = self.height if args[1] == "pages" else 1
+            self.scroll_by(int(args[0]) * step)
+
+    def on_wheel(self, event):
+        return self.scroll_by(-3 if event.delta > 0 else 3)